@@ -1,18 +1,39 @@
 #!/usr/bin/env python3
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from openpyxl import load_workbook
+from itertools import islice
 from pathlib import Path
+import multiprocessing
 import os
+import queue
 import subprocess
 import sys
+import threading
+import time
 
 from utils.theme import COLORS as C, F, F_BOLD, F_TITLE, F_SUB, F_SMALL, F_STAT, apply_styles
 from utils.text import normalize
-from utils.excel import load_dataframe, resolve_sheet_name, get_filter_header_rows
-from utils.comparison import collect_col_data, get_rows_with_unique_values, row_matches_search
-from utils.treeview import auto_size_columns
+from utils.excel import (cached_filter_rows, workbook_filter_rows, open_preview,
+                         preview_with_header, detect_headers)
+from utils.engine import (ComparisonSession, iter_comparison, mapped_columns, summarize,
+                          affected_mappings)
+from utils.export import export_result, export_batch
+from utils.batch import batch_configs, iter_batch, batch_detail, template_mappings
+from utils.treeview import auto_size_columns, sample_rows, VirtualTreeview
 from utils.template import show_template_validation_card
+from utils.search import SearchIndex
+from utils.fuzzy import DEFAULT_THRESHOLD
+from utils.timing import PROFILE_PATH, span, record, mark, take, totals, write_log, profiled
+from utils.watch import FileWatcher
+
+POLL_MS = 50
+SEARCH_DELAY_MS = 150
+PREVIEW_ROWS = 200
+PREVIEW_COLS = 40
+BATCH_FILES = 20
+BATCH_COLUMNS = [("#", "index"), ("File", "path"), ("Sheet", "sheet"), ("Template", "template"),
+                 ("Common", "common"), ("Only in #1", "only_in_1"), ("Only in file", "only_in_N"),
+                 ("Changed", "changed"), ("Load s", "load_seconds")]
 
 
 class App:
@@ -33,6 +54,23 @@ class App:
         self.template_mode = False
         self.template_files = []
         self.template_config = None
+        self.batch_targets = []
+        self.mappings = {}
+        self.nway = False
+        self.fuzzy = None
+        self.keys = []
+        self.session = ComparisonSession()
+        self.events = None
+        self.cancel_event = threading.Event()
+        self.watching = False
+        self.watcher = None
+        self.changes = queue.Queue()
+        self.stale = set()
+        self.wb = None
+        self.detected = None
+        self.preview_pending = False
+        self.rows_done = True
+        self.more_cols = False
         self.pick_files()
         self.root.mainloop()
 
@@ -55,6 +93,13 @@ class App:
             if messagebox.askyesno("", "Do you want to create a template?"):
                 self.template_mode = True
                 self.template_files = list(paths)
+        elif len(paths) == 1 and not self.file_configs:
+            if messagebox.askyesno("", "Use this file as a template for a whole folder?"):
+                folder = filedialog.askdirectory(title="Folder to check against the template")
+                if folder:
+                    self.template_mode = True
+                    self.template_files = list(paths)
+                    self.batch_targets = [folder]
         self.process_next_file()
 
     def process_next_file(self):
@@ -65,11 +110,77 @@ class App:
                 self.root.destroy()
             return
         self.cur_path = self.temp_files.pop(0)
-        self.wb = load_workbook(self.cur_path, data_only=True)
+        self.show_loading(f"Opening {Path(self.cur_path).name}...")
+        expected = [c for cfg in self.file_configs for c in cfg["columns"]]
+        self.run_in_background(lambda path=self.cur_path: preview_with_header(path, expected),
+                               self.on_workbook_loaded)
+
+    def on_workbook_loaded(self, loaded):
+        if isinstance(loaded, Exception):
+            messagebox.showerror("", f"Could not open {Path(self.cur_path).name}:\n{loaded}")
+            self.process_next_file(); return
+        self.wb, self.detected = loaded
         self.show_sheet_and_header()
 
+    def accept_detected(self):
+        paths = [self.cur_path] + self.temp_files
+        self.temp_files = []
+        self.wb.close()
+        self.wb = None
+        self.show_loading(f"Detecting headers in {len(paths)} files...")
+        self.run_in_background(lambda: detect_headers(paths, self.file_configs[0]["columns"]),
+                               lambda found: self.on_headers_detected(paths, found))
+
+    def on_headers_detected(self, paths, found):
+        if isinstance(found, Exception):
+            found = {}
+        expected = {c.lower() for c in self.file_configs[0]["columns"]}
+        for path in paths:
+            detected = found.get(path)
+            cols = [c for c in detected["columns"] if c.lower() in expected] if detected else []
+            if cols:
+                self.file_configs.append({"path": path, "sheet": detected["sheet"],
+                                          "header_row": detected["header_row"], "columns": cols})
+            else:
+                self.temp_files.append(path)
+        if self.temp_files:
+            messagebox.showinfo("", f"No matching header found in {len(self.temp_files)} file(s); "
+                                    "choose it manually.")
+            self.process_next_file()
+        else:
+            self.show_pair_selector()
+
+    def show_loading(self, text):
+        self.root.deiconify()
+        self.clear()
+        bar = tk.Frame(self.root, bg=C["bar"], height=80)
+        bar.pack(fill=tk.X); bar.pack_propagate(False)
+        tk.Label(bar, text=text, font=F_TITLE,
+                 fg=C["accent"], bg=C["bar"]).pack(side=tk.LEFT, padx=24, pady=16)
+
+    def run_in_background(self, work, on_done):
+        results = queue.Queue()
+
+        def target():
+            try:
+                results.put(work())
+            except Exception as e:
+                results.put(e)
+
+        def poll():
+            try:
+                value = results.get_nowait()
+            except queue.Empty:
+                self.root.after(POLL_MS, poll); return
+            on_done(value)
+
+        threading.Thread(target=target, daemon=True).start()
+        self.root.after(POLL_MS, poll)
+
     # ── Sheet + header row ───────────────────────────────────────────────
     def show_sheet_and_header(self):
+        if self.wb is None:
+            self.wb = open_preview(self.cur_path)
         self.root.deiconify()
         self.clear()
         self.history.append("sheet_and_header")
@@ -95,7 +206,10 @@ class App:
         for name in self.wb.sheetnames:
             suffix = "  [hidden]" if self.wb[name].sheet_state == "hidden" else ""
             self.sheet_lb.insert(tk.END, f"  {name}{suffix}")
-        self.sheet_lb.select_set(0)
+        detected = self.detected
+        if detected and detected["sheet"] not in self.wb.sheetnames:
+            detected = None
+        self.sheet_lb.select_set(self.wb.sheetnames.index(detected["sheet"]) if detected else 0)
         self.sheet_lb.bind("<<ListboxSelect>>", lambda _: self.load_sheet())
         self.sheet_lb.pack(fill=tk.BOTH, expand=True, padx=4, pady=4)
 
@@ -104,8 +218,12 @@ class App:
         ct.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         xscr = ttk.Scrollbar(ct, orient=tk.HORIZONTAL)
         yscr = ttk.Scrollbar(ct, orient=tk.VERTICAL)
-        self.tree = ttk.Treeview(ct, style="T.Treeview", show="headings",
-                                 xscrollcommand=xscr.set, yscrollcommand=yscr.set)
+        self.tree = ttk.Treeview(
+            ct, style="T.Treeview", show="headings",
+            xscrollcommand=lambda first, last: self.on_preview_scroll(
+                xscr, first, last, self.more_cols, self.load_more_cols),
+            yscrollcommand=lambda first, last: self.on_preview_scroll(
+                yscr, first, last, not self.rows_done, self.load_more_rows))
         xscr.config(command=self.tree.xview); yscr.config(command=self.tree.yview)
         yscr.pack(side=tk.RIGHT, fill=tk.Y)
         xscr.pack(side=tk.BOTTOM, fill=tk.X)
@@ -122,41 +240,109 @@ class App:
         self.next_btn = ttk.Button(bot, text="  Next  ", style="A.TButton",
                                    command=self.confirm_header, state=tk.DISABLED)
         self.next_btn.pack(side=tk.RIGHT)
+        if self.file_configs and detected:
+            ttk.Button(bot, text="  Use detected headers for this and remaining files  ",
+                       style="A.TButton", command=self.accept_detected).pack(side=tk.RIGHT,
+                                                                            padx=(0, 12))
         self.sel_row = None
         self.load_sheet()
+        if detected and detected["header_row"] < len(self.raw):
+            self.tree.selection_set(str(detected["header_row"]))
+            self.tree.see(str(detected["header_row"]))
 
     def selected_sheet_name(self):
         idx = self.sheet_lb.curselection()
         return self.wb.sheetnames[idx[0]] if idx else self.wb.sheetnames[0]
 
     def load_sheet(self):
-        ws = self.wb[self.selected_sheet_name()]
-        self.filter_rows = get_filter_header_rows(ws)
-        self.raw = [tuple(cell.value for cell in row)
-                    for row in ws.iter_rows(max_row=200, max_col=40)]
-        if not self.raw:
+        with span("load_sheet", file=Path(self.cur_path).name):
+            self.preview_ws = self.wb[self.selected_sheet_name()]
+            found = cached_filter_rows(self.cur_path)
+            self.filter_rows = found.get(self.preview_ws.title, set()) if found else set()
+            if found is None:
+                self.run_in_background(
+                    lambda path=self.cur_path: workbook_filter_rows(path),
+                    lambda found, ws=self.preview_ws: self.on_filter_rows(ws, found))
+            self.preview_cols = PREVIEW_COLS
+            self.raw = []
+            self.row_iter = self.preview_ws.iter_rows(max_col=self.preview_cols, values_only=True)
+            self.rows_done = self.more_cols = False
+            self.read_preview_rows()
+            if not self.raw:
+                return
+            self.render_preview()
+        self.sel_row = None
+        self.status.set("Click a row to mark it as the table header")
+        self.next_btn.config(state=tk.DISABLED)
+
+    def on_filter_rows(self, ws, found):
+        if isinstance(found, Exception) or ws is not self.preview_ws or not self.tree.winfo_exists():
             return
-        num_cols = max(len(r) for r in self.raw)
-        col_ids = [f"c{i}" for i in range(num_cols)]
-        headings = [f"Col {i+1}" for i in range(num_cols)]
-        self.tree.delete(*self.tree.get_children())
-        self.tree["columns"] = col_ids
+        self.filter_rows = found.get(ws.title, set())
+        for iid in self.tree.get_children():
+            if iid != str(self.sel_row):
+                self.tree.item(iid, tags=(self.preview_row_tag(int(iid)),))
+
+    def read_preview_rows(self):
+        rows = list(islice(self.row_iter, PREVIEW_ROWS))
+        self.rows_done = len(rows) < PREVIEW_ROWS
+        self.raw.extend(rows)
+        self.more_cols = ((self.preview_ws.max_column or 0) > self.preview_cols
+                          or any(r and r[-1] is not None for r in rows))
+        return rows
+
+    def preview_row_tag(self, i):
+        return "filter_row" if i in self.filter_rows else ("alt" if i % 2 else "normal")
+
+    def insert_preview_rows(self, start):
         display_values = []
-        for i, row in enumerate(self.raw):
+        for i, row in enumerate(self.raw[start:], start):
             vals = [normalize(x) if x is not None else "" for x in row]
-            vals += [""] * (num_cols - len(vals))
+            vals += [""] * (self.preview_cols - len(vals))
             display_values.append(vals)
-            tag = "filter_row" if i in self.filter_rows else ("alt" if i % 2 else "normal")
-            self.tree.insert("", "end", iid=str(i), values=vals, tags=(tag,))
+            self.tree.insert("", "end", iid=str(i), values=vals, tags=(self.preview_row_tag(i),))
+        return display_values
+
+    def render_preview(self):
+        col_ids = [f"c{i}" for i in range(self.preview_cols)]
+        headings = [f"Col {i+1}" for i in range(self.preview_cols)]
+        self.tree.delete(*self.tree.get_children())
+        self.tree["columns"] = col_ids
+        display_values = self.insert_preview_rows(0)
         for i, cid in enumerate(col_ids):
             self.tree.heading(cid, text=headings[i])
         auto_size_columns(self.tree, col_ids, display_values, headings)
         self.tree.tag_configure("filter_row", background=C["orange"], foreground=C["bar"])
         self.tree.tag_configure("alt", background=C["alt"])
         self.tree.tag_configure("normal", background=C["surface"])
-        self.sel_row = None
-        self.status.set("Click a row to mark it as the table header")
-        self.next_btn.config(state=tk.DISABLED)
+
+    def on_preview_scroll(self, scrollbar, first, last, has_more, load_more):
+        scrollbar.set(first, last)
+        if has_more and float(last) >= 1.0 and not self.preview_pending:
+            self.preview_pending = True
+            self.root.after_idle(load_more)
+
+    def load_more_rows(self):
+        self.preview_pending = False
+        start = len(self.raw)
+        if self.read_preview_rows():
+            self.insert_preview_rows(start)
+
+    def load_more_cols(self):
+        self.preview_pending = False
+        n_rows = len(self.raw)
+        self.preview_cols += PREVIEW_COLS
+        self.raw = list(self.preview_ws.iter_rows(max_row=n_rows, max_col=self.preview_cols,
+                                                  values_only=True))
+        self.row_iter = self.preview_ws.iter_rows(min_row=n_rows + 1, max_col=self.preview_cols,
+                                                  values_only=True)
+        self.more_cols = ((self.preview_ws.max_column or 0) > self.preview_cols
+                          or any(r and r[-1] is not None for r in self.raw))
+        xview = self.tree.xview()[0]
+        self.render_preview()
+        self.tree.xview_moveto(xview)
+        if self.sel_row is not None:
+            self.tree.selection_set(str(self.sel_row))
 
     def on_row_select(self, _):
         sel = self.tree.selection()
@@ -180,6 +366,7 @@ class App:
         self.cur_hdr_idx = self.sel_row
         self.cur_hdr_vals = self.raw[self.cur_hdr_idx]
         self.wb.close()
+        self.wb = None
         self.show_column_selection()
 
     # ── Column selection ─────────────────────────────────────────────────
@@ -242,10 +429,13 @@ class App:
         if self.template_mode and not self.template_config:
             self.template_config = {"sheet": self.cur_sheet,
                                     "header_row": self.cur_hdr_idx, "columns": cols}
+            if self.batch_targets or len(self.template_files) > BATCH_FILES:
+                self.run_batch(self.batch_targets or self.template_files[1:]); return
             for tfile in self.template_files[1:]:
                 self.file_configs.append({"path": tfile, "sheet": self.cur_sheet,
                                          "header_row": self.cur_hdr_idx, "columns": cols})
             self.generate_template_mappings()
+            self.nway = len(self.file_configs) > 2
             self.run_comparison()
         elif self.temp_files:
             self.process_next_file()
@@ -257,9 +447,8 @@ class App:
             messagebox.showinfo("", "Need at least 2 files"); self.pick_files()
 
     def generate_template_mappings(self):
-        cols = self.template_config["columns"]
-        self.mappings = {i: [(c, c) for c in cols]
-                         for i in range(1, len(self.file_configs))}
+        self.mappings = template_mappings(self.template_config["columns"],
+                                          len(self.file_configs))
 
     # ── Pair selector ────────────────────────────────────────────────────
     def show_pair_selector(self):
@@ -305,18 +494,24 @@ class App:
                      bg=C["surface"], fg=C["orange"]).grid(row=0, column=k+1,
                                                            sticky="w", padx=10, pady=(0, 8))
 
+        tk.Label(grid, text="Key", font=F_BOLD, bg=C["surface"],
+                 fg=C["purple"]).grid(row=0, column=1+len(others), padx=10, pady=(0, 8))
+
         tk.Frame(grid, bg=C["border"], height=1).grid(
-            row=1, column=0, columnspan=1+len(others), sticky="ew", padx=10, pady=(0, 6))
+            row=1, column=0, columnspan=2+len(others), sticky="ew", padx=10, pady=(0, 6))
 
+        previous = {(fidx, c1): cN for fidx, col_pairs in self.mappings.items()
+                    for c1, cN in col_pairs}
         self.map_vars = []
+        self.key_vars = []
         for ri, col1 in enumerate(f1["columns"]):
             tk.Label(grid, text=col1, font=F, bg=C["surface"],
                      fg=C["text"]).grid(row=ri+2, column=0, sticky="w", padx=(10, 20), pady=4)
             row_vars = []
             for k, oth in enumerate(others):
                 options = [SKIP] + oth["columns"]
-                var = tk.StringVar(value=SKIP)
-                for oc in oth["columns"]:
+                var = tk.StringVar(value=previous.get((k+1, col1), SKIP))
+                for oc in oth["columns"] if not self.mappings else ():
                     if oc.strip().lower() == col1.strip().lower():
                         var.set(oc); break
                 ttk.Combobox(grid, textvariable=var, values=options,
@@ -324,6 +519,11 @@ class App:
                     row=ri+2, column=k+1, sticky="w", padx=10, pady=4)
                 row_vars.append((k+1, var))
             self.map_vars.append((col1, row_vars))
+            key_var = tk.BooleanVar(value=col1 in self.keys)
+            tk.Checkbutton(grid, variable=key_var, bg=C["surface"], selectcolor=C["chk_sel"],
+                           activebackground=C["surface"]).grid(row=ri+2, column=1+len(others),
+                                                               padx=10, pady=4)
+            self.key_vars.append((col1, key_var))
 
         for c in range(1+len(others)):
             grid.columnconfigure(c, weight=1)
@@ -334,6 +534,21 @@ class App:
                    command=self.go_back).pack(side=tk.LEFT)
         ttk.Button(bot, text="  Compare  ", style="A.TButton",
                    command=self.confirm_pairs).pack(side=tk.RIGHT)
+        self.nway_var = tk.BooleanVar(value=self.nway if self.mappings
+                                      else len(self.file_configs) > 2)
+        tk.Checkbutton(bot, text="Also compare all files at once (N-way)", variable=self.nway_var,
+                       font=F, bg=C["bg"], fg=C["text"], selectcolor=C["chk_sel"],
+                       activebackground=C["bg"], activeforeground=C["accent"]).pack(
+            side=tk.RIGHT, padx=16)
+        self.fuzzy_var = tk.BooleanVar(value=self.fuzzy is not None)
+        self.threshold_var = tk.StringVar(value=f"{self.fuzzy or DEFAULT_THRESHOLD:.2f}")
+        ttk.Combobox(bot, textvariable=self.threshold_var, state="readonly", width=5, font=F,
+                     values=["0.95", "0.90", "0.85", "0.80", "0.75"]).pack(
+            side=tk.RIGHT)
+        tk.Checkbutton(bot, text="Fuzzy match near-identical values, similarity \u2265",
+                       variable=self.fuzzy_var, font=F, bg=C["bg"], fg=C["text"],
+                       selectcolor=C["chk_sel"], activebackground=C["bg"],
+                       activeforeground=C["accent"]).pack(side=tk.RIGHT, padx=(16, 4))
 
     def confirm_pairs(self):
         SKIP = "-- skip --"
@@ -344,6 +559,10 @@ class App:
                     self.mappings.setdefault(fidx, []).append((col1, var.get()))
         if not self.mappings:
             messagebox.showwarning("", "Map at least one column"); return
+        self.nway = self.nway_var.get() and len(self.mappings) > 1
+        mapped = {c1 for col_pairs in self.mappings.values() for c1, _ in col_pairs}
+        self.keys = [col1 for col1, var in self.key_vars if var.get() and col1 in mapped]
+        self.fuzzy = float(self.threshold_var.get()) if self.fuzzy_var.get() else None
         self.run_comparison()
 
     # ── Comparison results ───────────────────────────────────────────────
@@ -356,85 +575,550 @@ class App:
         tk.Label(bar, text="Comparison Results", font=F_TITLE,
                  fg=C["accent"], bg=C["bar"]).pack(side=tk.LEFT, padx=24, pady=16)
 
-        dfs = [load_dataframe(cfg["path"], cfg["header_row"],
-                              resolve_sheet_name(cfg["path"], cfg["sheet"]))
-               for cfg in self.file_configs]
+        bot = tk.Frame(self.root, bg=C["bg"])
+        bot.pack(side=tk.BOTTOM, fill=tk.X, padx=16, pady=12)
+        ttk.Button(bot, text="  New Comparison  ", style="A.TButton",
+                   command=self.new_comparison).pack(side=tk.RIGHT)
+        ttk.Button(bot, text="  Edit Mappings  ", style="A.TButton",
+                   command=self.edit_mappings).pack(side=tk.RIGHT, padx=(0, 12))
+        self.export_btn = ttk.Button(bot, text="  Export...  ", style="A.TButton",
+                                     command=self.export_results, state=tk.DISABLED)
+        self.export_btn.pack(side=tk.RIGHT, padx=(0, 12))
+        self.watch_var = tk.BooleanVar(value=self.watching)
+        ttk.Checkbutton(bot, text="Watch files", variable=self.watch_var,
+                        command=self.toggle_watch).pack(side=tk.RIGHT, padx=(0, 16))
+        self.cancel_btn = ttk.Button(bot, text="  Cancel  ", style="A.TButton",
+                                     command=self.cancel_comparison)
+        self.cancel_btn.pack(side=tk.RIGHT, padx=(0, 12))
+        self.progress = tk.StringVar(value="Loading files...")
+        tk.Label(bot, textvariable=self.progress, font=F, bg=C["bg"],
+                 fg=C["dim"]).pack(side=tk.LEFT)
 
         canvas = tk.Canvas(self.root, bg=C["bg"], highlightthickness=0)
         vsb = ttk.Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
-        results_frame = tk.Frame(canvas, bg=C["bg"])
-        results_frame.bind("<Configure>",
-                           lambda _: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=results_frame, anchor="nw", tags="inner")
+        self.results_frame = tk.Frame(canvas, bg=C["bg"])
+        self.results_frame.bind("<Configure>",
+                                lambda _: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=self.results_frame, anchor="nw", tags="inner")
         canvas.bind("<Configure>", lambda e: canvas.itemconfigure("inner", width=e.width))
-        canvas.configure(yscrollcommand=vsb.set)
+        canvas.configure(yscrollcommand=lambda *a: (vsb.set(*a), self.schedule_expand()))
         vsb.pack(side=tk.RIGHT, fill=tk.Y)
         canvas.pack(fill=tk.BOTH, expand=True, padx=12, pady=8)
         self.bind_scroll(canvas)
+        self.results_canvas = canvas
+        self.expand_pending = None
 
-        f1_cfg = self.file_configs[0]
-        f1_name = Path(f1_cfg["path"]).name
-        summary_data = []
-
-        for fidx, col_pairs in sorted(self.mappings.items()):
-            fN_cfg = self.file_configs[fidx]
-            fN_name = Path(fN_cfg["path"]).name
-
-            col_data_1 = {c1: collect_col_data(dfs[0], c1, f1_cfg["header_row"])
-                          for c1, _ in col_pairs}
-            col_data_N = {cN: collect_col_data(dfs[fidx], cN, fN_cfg["header_row"])
-                          for _, cN in col_pairs}
-
-            all_vals_1 = {v for data in col_data_1.values() for v in data.values()}
-            all_vals_N = {v for data in col_data_N.values() for v in data.values()}
-            common   = all_vals_1 & all_vals_N
-            unique_1 = all_vals_1 - all_vals_N
-            unique_N = all_vals_N - all_vals_1
-
-            rows_only_1 = get_rows_with_unique_values(col_data_1, unique_1)
-            rows_only_N = get_rows_with_unique_values(col_data_N, unique_N)
-
-            card = tk.Frame(results_frame, bg=C["surface"],
+        self.pair_cards = {}
+        for fidx in sorted(self.mappings):
+            card = tk.Frame(self.results_frame, bg=C["surface"],
                             highlightbackground=C["border"], highlightthickness=1)
             card.pack(fill=tk.X, pady=8, padx=6)
+            tk.Label(card, text=f"Waiting for {Path(self.file_configs[fidx]['path']).name}...",
+                     font=F, bg=C["surface"], fg=C["dim"]).pack(padx=20, pady=16, anchor="w")
+            self.pair_cards[fidx] = card
+
+        self.nway_card = None
+        if self.nway:
+            self.nway_card = tk.Frame(self.results_frame, bg=C["surface"],
+                                      highlightbackground=C["border"], highlightthickness=1)
+            self.nway_card.pack(fill=tk.X, pady=8, padx=6)
+            tk.Label(self.nway_card, text="Waiting for all files...", font=F,
+                     bg=C["surface"], fg=C["dim"]).pack(padx=20, pady=16, anchor="w")
+
+        self.result = {"file_configs": self.file_configs, "files": {}, "pairs": [], "nway": None}
+        self.summary_frame = self.perf_frame = None
+        self.start_comparison(self.mappings)
+        if self.watching:
+            self.start_watching()
+
+    def start_comparison(self, mappings, refresh=None):
+        self.run_mappings, self.refresh = mappings, refresh
+        self.run_started, self.run_since = time.perf_counter(), mark()
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+        threading.Thread(target=self.comparison_worker, daemon=True,
+                         args=(self.file_configs, mappings, self.template_config,
+                               self.nway, self.fuzzy, self.keys, self.session, self.events,
+                               self.cancel_event)).start()
+        self.root.after(POLL_MS, self.poll_comparison, self.events)
+
+    def comparison_worker(self, file_configs, mappings, template_config, nway, fuzzy, keys,
+                          session, events, cancel):
+        try:
+            with profiled():
+                for event in iter_comparison(file_configs, mappings,
+                                             workers=1 if PROFILE_PATH else None, cancel=cancel,
+                                             template_config=template_config, nway=nway,
+                                             session=session, fuzzy=fuzzy, keys=keys):
+                    events.put(event)
+        except Exception as e:
+            events.put(("error", None, e))
+        events.put(("done", None, None))
+
+    def poll_comparison(self, events):
+        if events is not self.events:
+            return
+        while True:
+            try:
+                kind, fidx, payload = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "file":
+                self.result["files"][fidx] = payload
+            elif kind == "pair":
+                if fidx in self.pair_cards and (self.refresh is None or fidx in self.refresh):
+                    self.result["pairs"] = [p for p in self.result["pairs"] if p["index"] != fidx]
+                    self.result["pairs"].append(payload)
+                    self.fill_pair_card(self.pair_cards[fidx], payload)
+                    self.schedule_expand()
+            elif kind == "nway":
+                self.result["nway"] = payload
+                if self.nway_card is not None:
+                    self.fill_nway_card(self.nway_card, payload)
+            elif kind == "error":
+                messagebox.showerror("", f"Comparison failed:\n{payload}")
+            elif kind == "done":
+                self.finish_comparison()
+                return
+            if self.refresh is None:
+                n_files, n_pairs = len(self.result["files"]), len(self.result["pairs"])
+                self.progress.set(f"Loaded {n_files}/{len(mapped_columns(self.mappings))} files  |  "
+                                  f"Compared {n_pairs}/{len(self.mappings)} pairs")
+        self.root.after(POLL_MS, self.poll_comparison, events)
+
+    def cancel_comparison(self):
+        self.cancel_event.set()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.progress.set("Cancelling...")
+
+    def finish_comparison(self):
+        self.events = None
+        self.cancel_btn.pack_forget()
+        for fidx, card in list(self.pair_cards.items()):
+            if not any(p["index"] == fidx for p in self.result["pairs"]):
+                card.destroy()
+                del self.pair_cards[fidx]
+        if self.nway_card is not None and self.result["nway"] is None:
+            self.nway_card.destroy()
+            self.nway_card = None
+        self.result["pairs"].sort(key=lambda p: p["index"])
+        for frame in (self.summary_frame, self.perf_frame):
+            if frame is not None:
+                frame.destroy()
+        self.summary_frame = self.build_summary(self.results_frame, summarize(self.result),
+                                                self.result["files"])
+        record("run_comparison", time.perf_counter() - self.run_started)
+        spans = take(self.run_since)
+        write_log(spans, files=[cfg["path"] for cfg in self.file_configs])
+        self.perf_frame = self.build_performance_panel(self.results_frame, totals(spans))
+        self.export_btn.config(state=tk.NORMAL)
+        if self.refresh is not None:
+            self.progress.set(f"Refreshed {len(self.refresh)} pairs at {time.strftime('%H:%M:%S')}")
+            self.rerun_stale()
+        elif self.cancel_event.is_set():
+            self.progress.set(f"Cancelled  |  {len(self.result['pairs'])}/{len(self.mappings)} pairs compared")
+        else:
+            self.progress.set(f"Done  |  {len(self.result['pairs'])} pairs compared")
 
-            tk.Label(card,
-                     text=f"{f1_name} [{f1_cfg['sheet']}]   vs   {fN_name} [{fN_cfg['sheet']}]",
-                     font=F_BOLD, bg=C["surface"], fg=C["text"]).pack(padx=20, pady=(16, 4), anchor="w")
-
-            mapped_str = "    ".join(f"{c1}  \u2192  {cN}" for c1, cN in col_pairs)
-            tk.Label(card, text=mapped_str, font=F,
-                     bg=C["surface"], fg=C["dim"]).pack(padx=20, pady=(0, 8), anchor="w")
-
-            if self.template_mode:
-                show_template_validation_card(card, self.template_config, fN_cfg, fN_name)
+    # ── Batch results ────────────────────────────────────────────────────
+    def run_batch(self, targets):
+        self.file_configs, self.mappings, self.template_config = batch_configs(
+            self.file_configs[0], targets)
+        self.nway, self.keys = False, []
+        self.root.deiconify()
+        self.clear()
 
-            stats = tk.Frame(card, bg=C["surface"])
-            stats.pack(fill=tk.X, padx=20, pady=6)
-            self.make_stat_badge(stats, "Common", len(common), C["green"])
-            self.make_stat_badge(stats, f"Only in {f1_name}", len(rows_only_1), C["accent"])
-            self.make_stat_badge(stats, f"Only in {fN_name}", len(rows_only_N), C["orange"])
+        bar = tk.Frame(self.root, bg=C["bar"], height=80)
+        bar.pack(fill=tk.X); bar.pack_propagate(False)
+        tk.Label(bar, text="Batch Results", font=F_TITLE,
+                 fg=C["accent"], bg=C["bar"]).pack(side=tk.LEFT, padx=24, pady=16)
+        tk.Label(bar, text=f"{len(self.mappings)} files vs {Path(self.file_configs[0]['path']).name}"
+                           f" [{self.template_config['sheet']}]",
+                 font=F_SUB, fg=C["dim"], bg=C["bar"]).pack(side=tk.RIGHT, padx=24)
 
-            cols_1 = [c1 for c1, _ in col_pairs]
-            cols_N = [cN for _, cN in col_pairs]
+        bot = tk.Frame(self.root, bg=C["bg"])
+        bot.pack(side=tk.BOTTOM, fill=tk.X, padx=16, pady=12)
+        ttk.Button(bot, text="  New Comparison  ", style="A.TButton",
+                   command=self.new_comparison).pack(side=tk.RIGHT)
+        self.export_btn = ttk.Button(bot, text="  Export...  ", style="A.TButton",
+                                     command=self.export_batch_results, state=tk.DISABLED)
+        self.export_btn.pack(side=tk.RIGHT, padx=(0, 12))
+        self.cancel_btn = ttk.Button(bot, text="  Cancel  ", style="A.TButton",
+                                     command=self.cancel_comparison)
+        self.cancel_btn.pack(side=tk.RIGHT, padx=(0, 12))
+        self.progress = tk.StringVar(value="Loading files...")
+        tk.Label(bot, textvariable=self.progress, font=F, bg=C["bg"],
+                 fg=C["dim"]).pack(side=tk.LEFT)
+
+        table = tk.Frame(self.root, bg=C["surface"],
+                         highlightbackground=C["border"], highlightthickness=1)
+        table.pack(fill=tk.X, padx=18, pady=(12, 4))
+        tk.Label(table, text="Double-click a file to see its details; click a heading to sort",
+                 font=F_SMALL, bg=C["surface"], fg=C["dim"]).pack(padx=12, pady=(8, 4), anchor="w")
+        headings = [title for title, _ in BATCH_COLUMNS]
+        self.batch_tree = VirtualTreeview(table, [], columns=headings, show="headings",
+                                          style="T.Treeview", height=14)
+        yscr = ttk.Scrollbar(table, orient=tk.VERTICAL, command=self.batch_tree.yview)
+        self.batch_tree.set_scroll_command(yscr.set)
+        for title, field in BATCH_COLUMNS:
+            self.batch_tree.heading(title, text=title,
+                                    command=lambda field=field: self.sort_batch(field))
+            text = field in ("path", "sheet", "template")
+            self.batch_tree.column(title, width=280 if field in ("path", "template") else 90,
+                                   anchor="w" if text else "e", stretch=field == "template")
+        self.batch_tree.tag_configure("alt", background=C["alt"])
+        self.batch_tree.tag_configure("normal", background=C["surface"])
+        self.batch_tree.bind("<Double-1>",
+                             lambda e: self.open_batch_row(self.batch_tree.identify_row(e.y)))
+        self.batch_tree.bind("<Return>", lambda _: self.open_batch_row(self.batch_tree.focus()))
+        yscr.pack(side=tk.RIGHT, fill=tk.Y)
+        self.batch_tree.pack(fill=tk.X, padx=(12, 0), pady=(0, 12))
 
-            if rows_only_1:
-                self.build_result_grid(card, f"Only in {f1_name}", cols_1,
-                                       rows_only_1, C["accent"], f1_cfg["path"])
-            if rows_only_N:
-                self.build_result_grid(card, f"Only in {fN_name}", cols_N,
-                                       rows_only_N, C["orange"], fN_cfg["path"])
+        canvas = tk.Canvas(self.root, bg=C["bg"], highlightthickness=0)
+        vsb = ttk.Scrollbar(self.root, orient=tk.VERTICAL, command=canvas.yview)
+        self.results_frame = tk.Frame(canvas, bg=C["bg"])
+        self.results_frame.bind("<Configure>",
+                                lambda _: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=self.results_frame, anchor="nw", tags="inner")
+        canvas.bind("<Configure>", lambda e: canvas.itemconfigure("inner", width=e.width))
+        canvas.configure(yscrollcommand=vsb.set)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        canvas.pack(fill=tk.BOTH, expand=True, padx=12, pady=8)
+        self.bind_scroll(canvas)
 
-            tk.Frame(card, bg=C["surface"], height=12).pack()
-            summary_data.append((f1_name, fN_name, len(common),
-                                 len(rows_only_1), len(rows_only_N), fidx+1))
+        self.result = {"file_configs": self.file_configs, "files": {}, "pairs": [], "nway": None}
+        self.batch_rows = {}
+        self.batch_sort = ("index", False)
+        self.batch_card = None
+        self.run_started, self.run_since = time.perf_counter(), mark()
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+        threading.Thread(target=self.batch_worker, daemon=True,
+                         args=(self.file_configs, self.mappings, self.template_config,
+                               self.fuzzy, self.events, self.cancel_event)).start()
+        self.root.after(POLL_MS, self.poll_batch, self.events)
+
+    def batch_worker(self, file_configs, mappings, template_config, fuzzy, events, cancel):
+        try:
+            for event in iter_batch(file_configs, mappings, template_config, cancel=cancel,
+                                    fuzzy=fuzzy):
+                if event[0] in ("row", "error"):
+                    events.put(event)
+        except Exception as e:
+            events.put(("error", None, e))
+        events.put(("done", None, None))
+
+    def poll_batch(self, events):
+        if events is not self.events:
+            return
+        added = False
+        while True:
+            try:
+                kind, fidx, payload = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "row":
+                self.batch_rows[fidx] = payload
+                added = True
+            elif kind == "error":
+                messagebox.showerror("", f"Batch failed:\n{payload}")
+            elif kind == "done":
+                self.finish_batch()
+                return
+        if added:
+            self.show_batch_rows()
+        self.root.after(POLL_MS, self.poll_batch, events)
+
+    def finish_batch(self):
+        self.events = None
+        self.cancel_btn.pack_forget()
+        self.show_batch_rows()
+        record("run_batch", time.perf_counter() - self.run_started)
+        write_log(take(self.run_since), files=[cfg["path"] for cfg in self.file_configs])
+        self.export_btn.config(state=tk.NORMAL)
+        rows = self.batch_rows.values()
+        mismatched = sum(r["template"] not in ("ok", "error") for r in rows)
+        failed = sum(r["error"] is not None for r in rows)
+        done = "Cancelled" if self.cancel_event.is_set() else "Done"
+        self.progress.set(f"{done}  |  {len(self.batch_rows)}/{len(self.mappings)} files  |  "
+                          f"{mismatched} template mismatches  |  {failed} failed  |  "
+                          f"{time.perf_counter() - self.run_started:.1f}s")
+
+    def batch_values(self, row):
+        load = row["load_seconds"]
+        values = [row["index"] + 1, Path(row["path"]).name, row["sheet"],
+                  row["error"] or row["template"], row["common"], row["only_in_1"],
+                  row["only_in_N"], row["changed"], None if load is None else f"{load:.2f}"]
+        return ["" if v is None else v for v in values]
+
+    def show_batch_rows(self):
+        field, desc = self.batch_sort
+        rows = sorted(self.batch_rows.values(),
+                      key=lambda r: (r[field] is None, r[field] if field != "path"
+                                     else Path(r["path"]).name.lower()))
+        if desc:
+            rows.reverse()
+        self.batch_tree.rows = [self.batch_values(r) for r in rows]
+        self.batch_tree.render()
+        if self.events is not None:
+            self.progress.set(f"Checked {len(self.batch_rows)}/{len(self.mappings)} files")
+
+    def sort_batch(self, field):
+        field_now, desc = self.batch_sort
+        self.batch_sort = (field, not desc if field == field_now else False)
+        self.show_batch_rows()
+
+    def open_batch_row(self, item):
+        if item:
+            self.show_batch_detail(int(self.batch_tree.item(item, "values")[0]) - 1)
+
+    def show_batch_detail(self, fidx):
+        if self.batch_card is not None:
+            self.batch_card.destroy()
+        self.batch_card = card = tk.Frame(self.results_frame, bg=C["surface"],
+                                          highlightbackground=C["border"], highlightthickness=1)
+        card.pack(fill=tk.X, pady=8, padx=6)
+        name = Path(self.batch_rows[fidx]["path"]).name
+        if self.batch_rows[fidx]["error"]:
+            self.show_batch_error(card, name, self.batch_rows[fidx]["error"]); return
+        tk.Label(card, text=f"Loading {name}...", font=F, bg=C["surface"],
+                 fg=C["dim"]).pack(padx=20, pady=16, anchor="w")
+        self.run_in_background(
+            lambda: batch_detail(self.file_configs, self.mappings, self.template_config, fidx,
+                                 fuzzy=self.fuzzy),
+            lambda loaded: self.on_batch_detail(card, name, loaded))
+
+    def on_batch_detail(self, card, name, loaded):
+        if card is not self.batch_card or not card.winfo_exists():
+            return
+        if isinstance(loaded, Exception):
+            for w in card.winfo_children():
+                w.destroy()
+            self.show_batch_error(card, name, loaded); return
+        info, pair = loaded
+        self.result["files"] = {pair["index"]: info}
+        self.fill_pair_card(card, pair)
+        if card.toggle is not None:
+            self.expand_card(card)
+
+    def show_batch_error(self, card, name, error):
+        tk.Label(card, text=f"Could not load {name}", font=F_BOLD, bg=C["surface"],
+                 fg=C["red"]).pack(padx=20, pady=(16, 4), anchor="w")
+        tk.Label(card, text=str(error), font=F, bg=C["surface"],
+                 fg=C["dim"]).pack(padx=20, pady=(0, 16), anchor="w")
+
+    def export_batch_results(self):
+        rows = [self.batch_rows[fidx] for fidx in sorted(self.batch_rows)]
+        self.export_in_background(lambda path: export_batch(rows, path))
+
+    def toggle_watch(self):
+        self.watching = self.watch_var.get()
+        if self.watching:
+            self.start_watching()
+        else:
+            self.stop_watching()
+
+    def start_watching(self):
+        self.stop_watching()
+        self.watcher = FileWatcher([cfg["path"] for cfg in self.file_configs],
+                                   self.changes.put).start()
+        self.root.after(POLL_MS, self.poll_changes, self.watcher)
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.stale.clear()
+
+    def poll_changes(self, watcher):
+        if watcher is not self.watcher:
+            return
+        while True:
+            try:
+                self.stale.add(self.changes.get_nowait())
+            except queue.Empty:
+                break
+        if self.events is None:
+            self.rerun_stale()
+        self.root.after(POLL_MS, self.poll_changes, watcher)
+
+    def rerun_stale(self):
+        if not self.stale or self.watcher is None:
+            return
+        changed = affected_mappings(self.file_configs, self.mappings, self.stale)
+        names = ", ".join(sorted(Path(path).name for path in self.stale))
+        self.stale.clear()
+        if not changed:
+            return
+        take()
+        self.export_btn.config(state=tk.DISABLED)
+        self.progress.set(f"Reloading {names}...")
+        self.start_comparison(self.mappings if self.nway else changed, set(changed))
+
+    def export_results(self):
+        result = dict(self.result, pairs=list(self.result["pairs"]))
+        self.export_in_background(lambda path: export_result(result, path))
+
+    def export_in_background(self, export):
+        path = filedialog.asksaveasfilename(
+            title="Export results", defaultextension=".xlsx",
+            filetypes=[("Excel workbook", "*.xlsx"), ("CSV", "*.csv")])
+        if not path:
+            return
+        self.export_btn.config(state=tk.DISABLED)
+        self.progress.set(f"Exporting to {Path(path).name}...")
+        started = time.perf_counter()
+
+        def on_done(value):
+            self.export_btn.config(state=tk.NORMAL)
+            if isinstance(value, Exception):
+                self.progress.set("Export failed")
+                messagebox.showerror("", f"Export failed:\n{value}"); return
+            self.progress.set(f"Exported {Path(value).name} in {time.perf_counter() - started:.1f}s")
+
+        self.run_in_background(lambda: export(path), on_done)
+
+    def fill_pair_card(self, card, pair):
+        expanded = getattr(card, "body", None) is not None
+        for w in card.winfo_children():
+            w.destroy()
+        card.pair, card.body, card.toggle = pair, None, None
+        card.closed = getattr(card, "closed", False)
+        f1_cfg = self.file_configs[0]
+        f1_name = Path(f1_cfg["path"]).name
+        fidx, col_pairs = pair["index"], pair["col_pairs"]
+        fN_cfg = self.file_configs[fidx]
+        fN_name = Path(fN_cfg["path"]).name
+        common = pair["common"]
+        rows_only_1, rows_only_N = pair["rows_only_1"], pair["rows_only_N"]
+
+        tk.Label(card,
+                 text=f"{f1_name} [{f1_cfg['sheet']}]   vs   {fN_name} [{fN_cfg['sheet']}]",
+                 font=F_BOLD, bg=C["surface"], fg=C["text"]).pack(padx=20, pady=(16, 4), anchor="w")
+
+        mapped_str = "    ".join(f"{c1}  \u2192  {cN}" + ("  (key)" if (c1, cN) in pair["key_pairs"]
+                                                            else "")
+                                   for c1, cN in col_pairs)
+        tk.Label(card, text=mapped_str, font=F,
+                 bg=C["surface"], fg=C["dim"]).pack(padx=20, pady=(0, 8), anchor="w")
+
+        if self.template_mode:
+            show_template_validation_card(card, self.template_config, fN_cfg, fN_name,
+                                          self.result["files"][fidx]["validation"])
+
+        stats = tk.Frame(card, bg=C["surface"])
+        stats.pack(fill=tk.X, padx=20, pady=6)
+        if pair["key_pairs"]:
+            self.make_stat_badge(stats, "Common keys", len(common), C["green"])
+            self.make_stat_badge(stats, "Matched rows", len(pair["matched"]), C["green"])
+            if len(pair["key_pairs"]) < len(col_pairs):
+                self.make_stat_badge(stats, "Changed cells", len(pair["changed"]), C["purple"])
+        else:
+            self.make_stat_badge(stats, "Common", len(common), C["green"])
+        if self.fuzzy is not None:
+            self.make_stat_badge(stats, "Near matches", len(pair["near"]), C["cyan"])
+        self.make_stat_badge(stats, f"Only in {f1_name}", len(rows_only_1), C["accent"])
+        self.make_stat_badge(stats, f"Only in {fN_name}", len(rows_only_N), C["orange"])
+
+        if pair["near"] or (pair["key_pairs"] and pair["changed"]) or rows_only_1 or rows_only_N:
+            card.toggle = tk.Button(card, text="\u25b8 Show rows", font=F_BOLD, anchor="w",
+                                    bg=C["surface"], fg=C["dim"], relief="flat", bd=0,
+                                    cursor="hand2", activebackground=C["surface"],
+                                    activeforeground=C["accent"],
+                                    command=lambda: self.toggle_card(card))
+            card.toggle.pack(fill=tk.X, padx=20, pady=(4, 0))
+            if expanded:
+                self.expand_card(card)
+        tk.Frame(card, bg=C["surface"], height=12).pack(side=tk.BOTTOM)
+
+    def expand_card(self, card):
+        pair = card.pair
+        f1_cfg = self.file_configs[0]
+        f1_name = Path(f1_cfg["path"]).name
+        fidx, col_pairs = pair["index"], pair["col_pairs"]
+        fN_cfg = self.file_configs[fidx]
+        fN_name = Path(fN_cfg["path"]).name
+        card.body = body = tk.Frame(card, bg=C["surface"])
+        body.pack(fill=tk.X)
+        card.toggle.config(text="\u25be Hide rows")
+
+        if pair["near"]:
+            self.build_grid(body, "Near matches", ["#1 value", f"#{fidx+1} value", "Score"],
+                            [[v1, vN, f"{score:.2f}"] for v1, vN, score in pair["near"]],
+                            C["cyan"])
+
+        if pair["key_pairs"] and pair["changed"]:
+            with span("build_changed_grid", rows=len(pair["changed"])):
+                self.build_grid(body, "Changed",
+                                ["Key", "#1 row", f"#{fidx+1} row", "Column",
+                                 f"{f1_name}", f"{fN_name}"],
+                                [[key, str(r1), str(rN), col, old, new]
+                                 for key, r1, rN, col, old, new in pair["changed"]],
+                                C["purple"])
+
+        if pair["rows_only_1"]:
+            self.build_result_grid(body, f"Only in {f1_name}", [c1 for c1, _ in col_pairs],
+                                   pair["rows_only_1"], C["accent"], f1_cfg["path"])
+        if pair["rows_only_N"]:
+            self.build_result_grid(body, f"Only in {fN_name}", [cN for _, cN in col_pairs],
+                                   pair["rows_only_N"], C["orange"], fN_cfg["path"])
+
+    def collapse_card(self, card):
+        card.body.destroy()
+        card.body = None
+        card.toggle.config(text="\u25b8 Show rows")
+
+    def toggle_card(self, card):
+        card.closed = card.body is not None
+        if card.closed:
+            self.collapse_card(card)
+        else:
+            self.expand_card(card)
 
-        self.build_summary(results_frame, summary_data)
+    def schedule_expand(self):
+        if self.expand_pending is None:
+            self.expand_pending = self.root.after(POLL_MS, self.expand_visible)
 
-        bot = tk.Frame(self.root, bg=C["bg"])
-        bot.pack(fill=tk.X, padx=16, pady=12)
-        ttk.Button(bot, text="  New Comparison  ", style="A.TButton",
-                   command=self.new_comparison).pack(side=tk.RIGHT)
+    def expand_visible(self):
+        self.expand_pending = None
+        canvas = self.results_canvas
+        if not canvas.winfo_exists():
+            return
+        top = canvas.canvasy(0)
+        bottom = top + canvas.winfo_height()
+        for card in self.pair_cards.values():
+            if (getattr(card, "toggle", None) is not None and card.body is None
+                    and not card.closed and card.winfo_y() < bottom
+                    and card.winfo_y() + card.winfo_height() > top):
+                self.expand_card(card)
+                self.schedule_expand()
+                return
+
+    def fill_nway_card(self, card, nway):
+        for w in card.winfo_children():
+            w.destroy()
+        names = {fidx: Path(self.file_configs[fidx]["path"]).name for fidx in nway["files"]}
+        tk.Label(card, text=f"All {len(names)} files", font=F_BOLD,
+                 bg=C["surface"], fg=C["text"]).pack(padx=20, pady=(16, 4), anchor="w")
+        stats = tk.Frame(card, bg=C["surface"])
+        stats.pack(fill=tk.X, padx=20, pady=6)
+        self.make_stat_badge(stats, "In every file", len(nway["in_all"]), C["green"])
+        for fidx, name in names.items():
+            row = tk.Frame(card, bg=C["surface"])
+            row.pack(fill=tk.X, padx=20, pady=2)
+            tk.Label(row, text=f"#{fidx+1}  {name}", font=F, width=32, anchor="w",
+                     bg=C["surface"], fg=C["dim"]).pack(side=tk.LEFT)
+            self.make_stat_badge(row, "Only here", len(nway["only_in"][fidx]), C["accent"])
+            self.make_stat_badge(row, "Missing here", len(nway["missing_from"][fidx]), C["orange"])
+
+        full = sum(1 << fidx for fidx in nway["files"])
+        file_cols = [f"File {fidx+1}" for fidx in nway["files"]]
+        all_rows = sorted([v] + ["\u2713" if mask & (1 << fidx) else "" for fidx in nway["files"]]
+                          for mask, values in nway["groups"].items() if mask != full
+                          for v in values)
+        if all_rows:
+            self.build_grid(card, "Not in every file", ["Value"] + file_cols, all_rows, C["cyan"])
+        tk.Frame(card, bg=C["surface"], height=12).pack()
 
     def make_stat_badge(self, parent, label, count, color):
         badge = tk.Frame(parent, bg=C["badge_bg"],
@@ -443,7 +1127,7 @@ class App:
         tk.Label(badge, text=f"  {label}:  {count}  ", font=F_STAT,
                  bg=C["badge_bg"], fg=color).pack(padx=4, pady=4)
 
-    def build_summary(self, parent, summary_data):
+    def build_summary(self, parent, summary_data, files=None):
         sm = tk.Frame(parent, bg=C["hdr_bg"],
                       highlightbackground=C["border"], highlightthickness=1)
         sm.pack(fill=tk.X, pady=8, padx=6)
@@ -454,9 +1138,51 @@ class App:
                      text=f"{f1_n} vs {fN_n}:  {common_c} common,  "
                           f"{u1_c} unique to #1,  {uN_c} unique to #{num}",
                      font=F, fg=C["dim"], bg=C["hdr_bg"]).pack(padx=20, pady=2, anchor="w")
+        for fidx, info in sorted((files or {}).items()):
+            tk.Label(sm,
+                     text=f"#{fidx+1}  {Path(info['path']).name} [{info['sheet']}]  "
+                          f"loaded in {info['load_seconds']:.2f}s",
+                     font=F_SMALL, fg=C["dim"], bg=C["hdr_bg"]).pack(padx=20, pady=1, anchor="w")
         tk.Frame(sm, bg=C["hdr_bg"], height=16).pack()
+        return sm
+
+    def build_performance_panel(self, parent, stages):
+        panel = tk.Frame(parent, bg=C["surface"],
+                         highlightbackground=C["border"], highlightthickness=1)
+        panel.pack(fill=tk.X, pady=8, padx=6)
+        body = tk.Frame(panel, bg=C["surface"])
+
+        def toggle():
+            if body.winfo_manager():
+                body.pack_forget()
+                btn.config(text="\u25b8 Performance")
+            else:
+                body.pack(fill=tk.X, padx=20, pady=(0, 12))
+                btn.config(text="\u25be Performance")
+
+        btn = tk.Button(panel, text="\u25b8 Performance", font=F_BOLD, anchor="w",
+                        bg=C["surface"], fg=C["dim"], relief="flat", bd=0, cursor="hand2",
+                        activebackground=C["surface"], activeforeground=C["accent"],
+                        command=toggle)
+        btn.pack(fill=tk.X, padx=20, pady=8)
+        rows = [("Stage", "Calls", "Total", "Slowest")]
+        rows += [(name, str(calls), f"{seconds:.3f}s", f"{slowest:.3f}s")
+                 for name, calls, seconds, slowest in stages]
+        for r, row in enumerate(rows):
+            for c, text in enumerate(row):
+                tk.Label(body, text=text, font=F_BOLD if r == 0 else F_SMALL,
+                         bg=C["surface"], fg=C["text"] if r == 0 else C["dim"],
+                         anchor="w" if c == 0 else "e").grid(row=r, column=c, sticky="ew",
+                                                             padx=(0, 24), pady=1)
+        return panel
 
     def build_result_grid(self, parent, title, col_names, rows_data, color, file_path):
+        with span("build_result_grid", rows=len(rows_data)):
+            all_rows = [[str(row)] + [rows_data[row].get(col, "") for col in col_names]
+                        for row in sorted(rows_data)]
+            self.build_grid(parent, title, ["Row"] + col_names, all_rows, color, file_path)
+
+    def build_grid(self, parent, title, all_columns, all_rows, color, file_path=None):
         fr = tk.Frame(parent, bg=C["surface"])
         fr.pack(fill=tk.X, padx=20, pady=(8, 4))
 
@@ -464,61 +1190,69 @@ class App:
         hdr.pack(fill=tk.X)
         tk.Label(hdr, text=f"{title}:", font=F_BOLD, bg=C["surface"],
                  fg=color).pack(side=tk.LEFT, anchor="w")
-        tk.Button(hdr, text="\u2197 Open in Excel", font=F_SMALL,
-                  bg=C["surface2"], fg=color, relief="flat", cursor="hand2",
-                  activebackground=C["alt"], activeforeground=color, bd=0,
-                  command=lambda: self.open_file(file_path)).pack(side=tk.LEFT, padx=12)
+        if file_path:
+            tk.Button(hdr, text="\u2197 Open in Excel", font=F_SMALL,
+                      bg=C["surface2"], fg=color, relief="flat", cursor="hand2",
+                      activebackground=C["alt"], activeforeground=color, bd=0,
+                      command=lambda: self.open_file(file_path)).pack(side=tk.LEFT, padx=12)
 
         search_frame = tk.Frame(fr, bg=C["surface"])
         search_frame.pack(fill=tk.X, pady=(6, 4))
         tk.Label(search_frame, text="Search:", font=F,
                  bg=C["surface"], fg=C["dim"]).pack(side=tk.LEFT, padx=(0, 4))
         search_var = tk.StringVar()
-        tk.Entry(search_frame, textvariable=search_var, font=F,
-                 bg=C["input_bg"], fg=C["text"], relief="flat", bd=0,
-                 insertbackground=C["accent"], highlightbackground=C["input_bd"],
-                 highlightcolor=C["accent"], highlightthickness=1).pack(
-            side=tk.LEFT, padx=(0, 10), fill=tk.X, expand=True, ipady=4)
+        search_entry = tk.Entry(search_frame, textvariable=search_var, font=F,
+                                bg=C["input_bg"], fg=C["text"], relief="flat", bd=0,
+                                insertbackground=C["accent"], highlightbackground=C["input_bd"],
+                                highlightcolor=C["accent"], highlightthickness=1)
+        search_entry.pack(side=tk.LEFT, padx=(0, 10), fill=tk.X, expand=True, ipady=4)
         tk.Label(search_frame, text="A11*=starts  *A11*=contains  *A11=ends  A11=exact",
                  font=F_SMALL, bg=C["surface"], fg=C["dim"]).pack(side=tk.LEFT)
 
         grid_frame = tk.Frame(fr, bg=C["surface"])
         grid_frame.pack(fill=tk.X, pady=(4, 4))
 
-        all_columns = ["Row"] + col_names
-        tree = ttk.Treeview(grid_frame, columns=all_columns, show="headings",
-                            style="T.Treeview", height=min(len(rows_data), 10))
+        tree = VirtualTreeview(grid_frame, all_rows, columns=all_columns, show="headings",
+                               style="T.Treeview", height=min(len(all_rows), 10))
         yscr = ttk.Scrollbar(grid_frame, orient=tk.VERTICAL, command=tree.yview)
         xscr = ttk.Scrollbar(grid_frame, orient=tk.HORIZONTAL, command=tree.xview)
-        tree.configure(yscrollcommand=yscr.set, xscrollcommand=xscr.set)
+        tree.configure(xscrollcommand=xscr.set)
+        tree.set_scroll_command(yscr.set)
 
         for col in all_columns:
             tree.heading(col, text=col)
-        tree.column("Row", anchor="center", stretch=False)
+        search_index = SearchIndex(all_rows)
+        tree.heading(all_columns[0], text=f"{all_columns[0]} \u2195",
+                     command=lambda: self.sort_grid(tree, search_index, search_var))
+        if all_columns[0] == "Row":
+            tree.column("Row", anchor="center", stretch=False)
 
-        all_rows = [[str(row)] + [rows_data[row].get(col, "") for col in col_names]
-                    for row in sorted(rows_data)]
-
-        for i, values in enumerate(all_rows):
-            tree.insert("", "end", values=values, tags=("alt" if i % 2 else "normal",))
-
-        auto_size_columns(tree, all_columns, all_rows, all_columns)
+        auto_size_columns(tree, all_columns, sample_rows(all_rows), all_columns)
         tree.tag_configure("alt", background=C["alt"])
         tree.tag_configure("normal", background=C["surface"])
 
-        search_var.trace_add("write", lambda *_: self.filter_tree(tree, all_rows, search_var))
+        search_entry.bind("<FocusIn>", lambda _: search_index.prepare())
+        search_var.trace_add("write", lambda *_: self.schedule_filter(tree, search_index, search_var))
         tree.bind("<Double-1>", lambda e: self.on_cell_double_click(tree, e))
 
         yscr.pack(side=tk.RIGHT, fill=tk.Y)
         xscr.pack(side=tk.BOTTOM, fill=tk.X)
         tree.pack(fill=tk.X)
 
-    def filter_tree(self, tree, all_rows, search_var):
-        pattern = search_var.get().strip()
-        tree.delete(*tree.get_children())
-        for i, values in enumerate(all_rows):
-            if not pattern or row_matches_search(values, pattern):
-                tree.insert("", "end", values=values, tags=("alt" if i % 2 else "normal",))
+    def schedule_filter(self, tree, search_index, search_var):
+        if tree.pending_filter:
+            self.root.after_cancel(tree.pending_filter)
+        tree.pending_filter = self.root.after(
+            SEARCH_DELAY_MS, lambda: self.filter_tree(tree, search_index, search_var))
+
+    def filter_tree(self, tree, search_index, search_var):
+        tree.pending_filter = None
+        rows = search_index.search(search_var.get().strip())
+        tree.set_rows(rows[::-1] if tree.sort_desc else rows)
+
+    def sort_grid(self, tree, search_index, search_var):
+        tree.sort_desc = not tree.sort_desc
+        self.filter_tree(tree, search_index, search_var)
 
     def on_cell_double_click(self, tree, event):
         item = tree.identify_row(event.y)
@@ -558,13 +1292,31 @@ class App:
         canvas.bind_all("<Button-4>", lambda e: scroll_widget(e, -3))
         canvas.bind_all("<Button-5>", lambda e: scroll_widget(e, 3))
 
+    def edit_mappings(self):
+        self.cancel_event.set()
+        self.events = None
+        self.stop_watching()
+        if self.history and self.history[-1] == "pair_selector":
+            self.history.pop()
+        self.show_pair_selector()
+
     def new_comparison(self):
+        self.cancel_event.set()
+        self.events = None
+        self.stop_watching()
+        self.session = ComparisonSession()
+        self.mappings = {}
+        self.nway = False
+        self.fuzzy = None
+        self.keys = []
+        take()
         self.file_configs = []
         self.history = []
         self.temp_files = []
         self.template_mode = False
         self.template_files = []
         self.template_config = None
+        self.batch_targets = []
         self.pick_files()
 
     def go_back(self):
@@ -581,4 +1333,5 @@ class App:
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     App()
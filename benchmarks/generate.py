@@ -0,0 +1,120 @@
+import argparse
+import random
+import warnings
+from pathlib import Path
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.filters import AutoFilter
+from openpyxl.worksheet.table import Table, TableColumn
+
+SHEET = "Cable List"
+BASE_COLUMNS = ["Tag", "From", "To", "Cable Type", "Cores", "Size", "Length",
+                "Route", "Panel", "Drawing", "Revision", "Remarks"]
+CABLE_TYPES = ["NYY-J", "NYCY", "LiYCY", "H07RN-F", "N2XH-J", "ÖLFLEX 110", "CAT6A S/FTP"]
+ROUTES = ["TR-01", "TR-02", "TR-03/A", "DUCT 4", "CONDUIT C7"]
+
+
+def column_names(columns):
+    return BASE_COLUMNS[:columns] + [f"Field {i}" for i in range(len(BASE_COLUMNS), columns)]
+
+
+def tags(rows, overlap, reference, rng):
+    shared = int(rows * overlap)
+    if reference:
+        return [f"C-{i:06d}" for i in range(rows)]
+    values = rng.sample([f"C-{i:06d}" for i in range(rows)], shared)
+    values += [f"X-{i:06d}" for i in range(rows - shared)]
+    rng.shuffle(values)
+    return values
+
+
+def cell(name, tag, rng):
+    if name == "Tag":
+        return tag
+    if name in ("From", "To"):
+        return f"{rng.choice(['MCC', 'DB', 'JB', 'PLC'])}-{rng.randint(1, 80):02d}"
+    if name == "Cable Type":
+        return rng.choice(CABLE_TYPES)
+    if name == "Cores":
+        return rng.choice([2, 3, 4, 5, 7, 12, 19])
+    if name == "Size":
+        return rng.choice(["1.5", "2.5", "4", "6", "10", "16", "35"])
+    if name == "Length":
+        return round(rng.uniform(2, 400), 1)
+    if name == "Route":
+        return rng.choice(ROUTES)
+    if name == "Panel":
+        return f"P{rng.randint(1, 40):02d}"
+    if name == "Drawing":
+        return f"DWG-{rng.randint(1000, 1400)}"
+    if name == "Revision":
+        return rng.choice(["A", "B", "C", "0", "1"])
+    if name == "Remarks":
+        return rng.choice([None, None, None, "spare", "  re-routed  ", "see note 4"])
+    return f"{name[:1]}{rng.randint(0, 9999)}"
+
+
+def generate_workbook(path, rows=5000, columns=12, overlap=0.8, hidden_sheets=1,
+                      header_offset=3, filter=None, reference=True, seed=0):
+    rng = random.Random(f"{seed}-{reference}")
+    names = column_names(columns)
+    wb = Workbook(write_only=True)
+    for i in range(hidden_sheets):
+        hidden = wb.create_sheet(f"Lookup {i+1}")
+        hidden.sheet_state = "hidden"
+        for r in range(200):
+            hidden.append([f"L{r}", rng.randint(0, 999)])
+    ws = wb.create_sheet(SHEET)
+    for r in range(header_offset):
+        ws.append([f"Project cable schedule, sheet {r+1}"] if r == 0 else [])
+    ws.append(names)
+    for tag in tags(rows, overlap, reference, rng):
+        ws.append([cell(name, tag, rng) for name in names])
+    ref = f"A{header_offset+1}:{get_column_letter(columns)}{header_offset+rows+1}"
+    if filter == "table":
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            ws.add_table(Table(displayName="Cables", ref=ref, autoFilter=AutoFilter(ref=ref),
+                               tableColumns=[TableColumn(id=i+1, name=n)
+                                             for i, n in enumerate(names)]))
+    elif filter == "autofilter":
+        ws.auto_filter.ref = ref
+    wb.save(path)
+    return {"path": str(path), "sheet": SHEET, "header_row": header_offset, "columns": names}
+
+
+def generate_pair(folder, **options):
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    return [generate_workbook(Path(folder) / f"{name}.xlsx", reference=name == "reference", **options)
+            for name in ("reference", "revised")]
+
+
+def add_arguments(parser):
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--columns", type=int, default=12)
+    parser.add_argument("--overlap", type=float, default=0.8,
+                        help="share of tags the revised file has in common with the reference")
+    parser.add_argument("--hidden-sheets", type=int, default=1)
+    parser.add_argument("--header-offset", type=int, default=3,
+                        help="title rows above the header")
+    parser.add_argument("--filter", choices=["table", "autofilter"])
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def options(args):
+    return {"rows": args.rows, "columns": args.columns, "overlap": args.overlap,
+            "hidden_sheets": args.hidden_sheets, "header_offset": args.header_offset,
+            "filter": args.filter, "seed": args.seed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a reference and a revised cable list")
+    parser.add_argument("folder")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    for cfg in generate_pair(args.folder, **options(args)):
+        print(cfg["path"])
+
+
+if __name__ == "__main__":
+    main()
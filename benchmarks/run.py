@@ -0,0 +1,156 @@
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.generate import add_arguments, options, generate_pair
+from utils.comparison import collect_col_data, get_rows_with_unique_values
+from utils.engine import compare_pair, compare_files
+from utils.excel import load_dataframe, find_actual_header_row, detect_headers
+from utils.fuzzy import DEFAULT_THRESHOLD
+
+BASELINE = Path(__file__).with_name("baseline.json")
+NOISE_SECONDS = 0.005
+NOISE_MB = 1.0
+
+
+def measure(work, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        work()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(seconds), "peak_mb": peak / 1024 / 1024}
+
+
+def grid_stage(columns, rows_data):
+    import tkinter as tk
+    from ExcelColumnComparator import App
+    from utils.theme import apply_styles
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None, None
+    root.withdraw()
+    apply_styles()
+    app = App.__new__(App)
+    app.root = root
+
+    def work():
+        frame = tk.Frame(root)
+        app.build_result_grid(frame, "Only in #1", columns, rows_data, "#ffffff", None)
+        root.update_idletasks()
+        frame.destroy()
+    return work, root
+
+
+def run_stages(configs, compare, repeat, fuzzy=DEFAULT_THRESHOLD):
+    ref, rev = configs
+    stages = {}
+    frames = {}
+
+    def load():
+        for cfg in configs:
+            frames[cfg["path"]] = load_dataframe(cfg["path"], cfg["header_row"], cfg["sheet"],
+                                                 compare)
+    stages["load_dataframe"] = measure(load, repeat)
+
+    col_data = {}
+
+    def collect():
+        for cfg in configs:
+            col_data[cfg["path"]] = {c: collect_col_data(frames[cfg["path"]], c, cfg["header_row"])
+                                     for c in compare}
+    stages["collect_col_data"] = measure(collect, repeat)
+
+    col_data_1, col_data_N = col_data[ref["path"]], col_data[rev["path"]]
+    pair = compare_pair(col_data_1, col_data_N)
+    unique_1 = {v for data in col_data_1.values() for v in data.values()} - pair["common"]
+    stages["get_rows_with_unique_values"] = measure(
+        lambda: get_rows_with_unique_values(col_data_1, unique_1), repeat)
+    stages["compare_pair"] = measure(lambda: compare_pair(col_data_1, col_data_N), repeat)
+    stages["fuzzy_matches"] = measure(lambda: compare_pair(col_data_1, col_data_N, fuzzy), repeat)
+    stages["find_actual_header_row"] = measure(
+        lambda: find_actual_header_row(rev["path"], rev["sheet"], compare), repeat)
+    stages["detect_headers"] = measure(
+        lambda: detect_headers([cfg["path"] for cfg in configs], compare), repeat)
+
+    work, root = grid_stage(compare, pair["rows_only_1"])
+    if work is not None:
+        stages["build_result_grid"] = measure(work, repeat)
+        root.destroy()
+
+    mappings = {1: [(c, c) for c in compare]}
+    stages["compare_files"] = measure(
+        lambda: compare_files(configs, mappings, workers=1, use_cache=False), repeat)
+    return stages
+
+
+def check(stages, baseline, tolerance):
+    regressions = []
+    print(f"{'stage':<30}{'seconds':>10}{'peak MB':>10}  vs baseline")
+    for name, stage in stages.items():
+        base = baseline.get(name)
+        note = ""
+        if base:
+            ratio = stage["seconds"] / base["seconds"] if base["seconds"] else 1.0
+            note = f"{ratio:.2f}x"
+            slower = (ratio > 1 + tolerance
+                      and stage["seconds"] - base["seconds"] > NOISE_SECONDS)
+            bigger = stage["peak_mb"] > base["peak_mb"] * (1 + tolerance) + NOISE_MB
+            if slower or bigger:
+                regressions.append(name)
+                note += "  REGRESSION"
+        print(f"{name:<30}{stage['seconds']:>10.4f}{stage['peak_mb']:>10.1f}  {note}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each comparison stage on generated workbooks")
+    add_arguments(parser)
+    parser.add_argument("--compare", default="Tag,Panel", help="comma-separated columns to compare")
+    parser.add_argument("--fuzzy", type=float, default=DEFAULT_THRESHOLD,
+                        help="similarity threshold for the fuzzy_matches stage")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown or memory growth before a stage fails")
+    parser.add_argument("--keep", type=Path, help="write the workbooks here instead of a temp folder")
+    args = parser.parse_args(argv)
+
+    compare = args.compare.split(",")
+    with tempfile.TemporaryDirectory() as tmp:
+        configs = generate_pair(args.keep or tmp, **options(args))
+        stages = run_stages(configs, compare, args.repeat, args.fuzzy)
+
+    current = {"options": dict(options(args), compare=compare, fuzzy=args.fuzzy),
+               "stages": stages}
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        saved = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if saved["options"] == current["options"]:
+            baseline = saved["stages"]
+        else:
+            print(f"Baseline {args.baseline} was recorded with other options, not comparing",
+                  file=sys.stderr)
+    regressions = check(stages, baseline, args.tolerance)
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(current, indent=2), encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+    if regressions:
+        print(f"Slower than baseline: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
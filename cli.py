@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+from utils.batch import batch_configs, iter_batch
+from utils.cache import cache_dir, clear
+from utils.comparison import missing_from
+from utils.engine import compare_files, summarize
+from utils.export import export_result, write_csv, write_batch_csv
+from utils.fuzzy import DEFAULT_THRESHOLD
+from utils.index import index_path, update_index, lookup
+from utils.timing import LOG_PATH, PROFILE_PATH, mark, take, totals, write_log, profiled
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    mappings = {int(fidx): [tuple(p) for p in col_pairs]
+                for fidx, col_pairs in config.get("mappings", {}).items()}
+    return config["file_configs"], mappings, config.get("keys", [])
+
+
+def nway_to_json(result, subsets):
+    nway = result["nway"]
+    paths = {fidx: result["file_configs"][fidx]["path"] for fidx in nway["files"]}
+    return {
+        "files": [paths[fidx] for fidx in nway["files"]],
+        "in_all": sorted(nway["in_all"]),
+        "only_in": {paths[fidx]: sorted(v) for fidx, v in nway["only_in"].items()},
+        "missing_from": {paths[fidx]: sorted(v) for fidx, v in nway["missing_from"].items()},
+        "missing_from_subsets": [{"files": [paths[fidx] for fidx in subset],
+                                  "values": sorted(missing_from(nway["groups"], subset))}
+                                 for subset in subsets],
+    }
+
+
+def result_to_json(result, subsets=()):
+    pairs = []
+    for pair in result["pairs"]:
+        fN_cfg = result["file_configs"][pair["index"]]
+        pairs.append({
+            "file": fN_cfg["path"],
+            "index": pair["index"],
+            "col_pairs": [list(p) for p in pair["col_pairs"]],
+            "common": sorted(pair["common"]),
+            "only_in_1": [{"row": row, **pair["rows_only_1"][row]}
+                          for row in sorted(pair["rows_only_1"])],
+            "only_in_N": [{"row": row, **pair["rows_only_N"][row]}
+                          for row in sorted(pair["rows_only_N"])],
+            "near_matches": [{"value_1": v1, "value_N": vN, "score": round(score, 3)}
+                             for v1, vN, score in pair["near"]],
+        })
+        if pair["key_pairs"]:
+            pairs[-1]["key_pairs"] = [list(p) for p in pair["key_pairs"]]
+            pairs[-1]["matched"] = [{"row_1": r1, "row_N": rN} for r1, rN in pair["matched"]]
+            pairs[-1]["changed"] = [{"key": key, "row_1": r1, "row_N": rN, "column": col,
+                                     "old": old, "new": new}
+                                    for key, r1, rN, col, old, new in pair["changed"]]
+    files = [{"index": fidx, "path": info["path"], "sheet": info["sheet"],
+              "load_seconds": info["load_seconds"]}
+             for fidx, info in sorted(result["files"].items())]
+    out = {"reference": result["file_configs"][0]["path"], "files": files, "pairs": pairs}
+    if result["nway"]:
+        out["nway"] = nway_to_json(result, subsets)
+    return out
+
+
+def threshold(text):
+    value = float(text)
+    if not 0 < value <= 1:
+        raise argparse.ArgumentTypeError(f"must be above 0 and at most 1, got {text}")
+    return value
+
+
+def parse_subsets(parser, specs, mappings):
+    files = {0, *mappings}
+    subsets = []
+    for spec in specs:
+        try:
+            subset = [int(n) - 1 for n in spec.split(",")]
+        except ValueError:
+            parser.error(f"--missing-from {spec}: expected comma-separated file numbers")
+        bad = [fidx + 1 for fidx in subset if fidx not in files]
+        if bad:
+            parser.error(f"--missing-from {spec}: file numbers must be 1 or a mapped file "
+                         f"({', '.join(str(fidx + 1) for fidx in sorted(files))}), got "
+                         f"{', '.join(map(str, bad))}")
+        subsets.append(subset)
+    return subsets
+
+
+def run_index(args):
+    if args.index:
+        start = time.perf_counter()
+        report = update_index(args.index, args.index_db, args.engine, args.workers)
+        for path, error in report["failed"].items():
+            print(f"Skipped {path}: {error}", file=sys.stderr)
+        print(f"Indexed {len(report['indexed'])} workbooks, {report['unchanged']} unchanged, "
+              f"{len(report['removed'])} removed in {time.perf_counter() - start:.2f}s "
+              f"({args.index_db or index_path()})", file=sys.stderr)
+    for pattern in args.find:
+        start = time.perf_counter()
+        hits = lookup(pattern, args.index_db)
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            if args.format == "csv":
+                writer = csv.writer(out)
+                writer.writerow(["value", "path", "sheet", "column", "row"])
+                writer.writerows([h["value"], h["path"], h["sheet"], h["column"], h["row"]]
+                                 for h in hits)
+            else:
+                json.dump(hits, out, indent=2, ensure_ascii=False)
+                out.write("\n")
+        finally:
+            if args.output:
+                out.close()
+        print(f"{pattern}: {len(hits)} cells in {len({h['path'] for h in hits})} files "
+              f"({(time.perf_counter() - start) * 1000:.1f} ms)", file=sys.stderr)
+
+
+def run_batch(args, file_configs, keys):
+    file_configs, mappings, template_config = batch_configs(file_configs[0], args.batch)
+    result = {"file_configs": file_configs, "files": {}, "pairs": [], "nway": None}
+    rows = []
+    start, since = time.perf_counter(), mark()
+    for kind, fidx, payload in iter_batch(file_configs, mappings, template_config, args.engine,
+                                          args.workers, use_cache=not args.no_cache,
+                                          fuzzy=args.fuzzy, keys=keys):
+        if kind == "file":
+            result["files"][fidx] = payload
+        elif kind == "pair" and args.format == "xlsx":
+            result["pairs"].append(payload)
+        elif kind == "row":
+            rows.append(payload)
+            if payload["template"] != "ok":
+                print(f"[{len(rows)}/{len(mappings)}] {Path(payload['path']).name}: "
+                      f"{payload['error'] or payload['template']}", file=sys.stderr)
+    rows.sort(key=lambda r: r["index"])
+    result["pairs"].sort(key=lambda p: p["index"])
+    elapsed = time.perf_counter() - start
+    spans = take(since)
+    write_log(spans, args.timing_log, config=args.config, batch=args.batch)
+
+    if args.format == "xlsx":
+        export_result(result, args.output)
+    else:
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            if args.format == "json":
+                json.dump({"reference": file_configs[0]["path"], "template": template_config,
+                           "files": rows}, out, indent=2, ensure_ascii=False)
+                out.write("\n")
+            else:
+                write_batch_csv(rows, out)
+        finally:
+            if args.output:
+                out.close()
+
+    mismatched = sum(r["template"] not in ("ok", "error") for r in rows)
+    failed = sum(r["error"] is not None for r in rows)
+    if args.timings:
+        for name, calls, seconds, slowest in totals(spans):
+            print(f"  {name:<28}{calls:>5} calls  {seconds:8.3f}s  (slowest {slowest:.3f}s)",
+                  file=sys.stderr)
+    print(f"Compared {len(rows)} files against {Path(file_configs[0]['path']).name} in "
+          f"{elapsed:.2f}s:  {mismatched} template mismatches,  {failed} failed", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Excel columns without the GUI")
+    parser.add_argument("config", nargs="?", help="JSON file with 'file_configs' and 'mappings'")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-f", "--format", choices=["json", "csv", "xlsx"], default="json",
+                        help="xlsx writes one sheet per pair and needs -o")
+    parser.add_argument("--engine", choices=["openpyxl", "calamine", "stream"],
+                        help="Excel parser (default: calamine when installed, else openpyxl; "
+                             "stream reads .xlsx row by row, used automatically above 50 MB)")
+    parser.add_argument("-j", "--workers", type=int,
+                        help="worker processes for loading files (default: one per CPU, 1 = no pool)")
+    parser.add_argument("--nway", action="store_true",
+                        help="also report presence of every value across all files")
+    parser.add_argument("--missing-from", action="append", default=[], metavar="2,3",
+                        help="with --nway: list values absent from all of these file numbers")
+    parser.add_argument("--fuzzy", nargs="?", type=threshold, const=DEFAULT_THRESHOLD,
+                        metavar="THRESHOLD",
+                        help="pair leftover values that differ only in formatting or a few "
+                             f"characters (trigram similarity, default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--key", action="append", metavar="COLUMN",
+                        help="compare rows keyed on these File #1 columns (repeat for a "
+                             "composite key) instead of pooling all mapped values")
+    parser.add_argument("--batch", action="append", metavar="PATH",
+                        help="compare every workbook in this folder or glob (repeatable) "
+                             "against the first file in the config, used as the template, "
+                             "and report one summary row per file")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the workbooks")
+    parser.add_argument("--timings", action="store_true", help="print time spent in each stage")
+    parser.add_argument("--timing-log", default=LOG_PATH, metavar="PATH",
+                        help="append stage timings as a JSON line (default: $ECC_TIMING_LOG)")
+    parser.add_argument("--profile", default=PROFILE_PATH, metavar="PATH",
+                        help="write a cProfile report, binary if PATH ends in .prof "
+                             "(default: $ECC_PROFILE; loads in-process unless -j is given)")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="delete the parsed-column cache and exit")
+    parser.add_argument("--index", action="append", default=[], metavar="PATH",
+                        help="add or refresh workbooks (files or folders) in the value index "
+                             "and exit; unchanged files are skipped")
+    parser.add_argument("--find", action="append", default=[], metavar="PATTERN",
+                        help="list every indexed cell matching PATTERN (ID, ID*, *ID or *ID*) "
+                             "and exit")
+    parser.add_argument("--index-db", metavar="PATH",
+                        help="value index database (default: $ECC_INDEX or index.sqlite in "
+                             "the cache folder)")
+    args = parser.parse_args(argv)
+
+    if args.clear_cache:
+        clear()
+        print(f"Cleared {cache_dir()}", file=sys.stderr)
+        return
+    if args.index or args.find:
+        if args.format == "xlsx":
+            parser.error("--find writes json or csv")
+        run_index(args)
+        return
+    if not args.config:
+        parser.error("config is required")
+
+    if args.format == "xlsx" and not args.output:
+        parser.error("--format xlsx needs --output")
+
+    file_configs, mappings, keys = load_config(args.config)
+    keys = args.key or keys
+    subsets = parse_subsets(parser, args.missing_from, mappings)
+    if args.batch:
+        run_batch(args, file_configs, keys)
+        return
+    start, since = time.perf_counter(), mark()
+    workers = 1 if args.profile and args.workers is None else args.workers
+    with profiled(args.profile):
+        result = compare_files(file_configs, mappings, args.engine, workers,
+                               not args.no_cache, args.nway or bool(args.missing_from),
+                               fuzzy=args.fuzzy, keys=keys)
+    elapsed = time.perf_counter() - start
+    spans = take(since)
+    write_log(spans, args.timing_log, config=args.config)
+
+    if args.format == "xlsx":
+        export_result(result, args.output)
+    else:
+        out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        try:
+            if args.format == "json":
+                json.dump(result_to_json(result, subsets), out, indent=2, ensure_ascii=False)
+                out.write("\n")
+            else:
+                write_csv(result, out)
+        finally:
+            if args.output:
+                out.close()
+
+    for fidx, info in sorted(result["files"].items()):
+        source = "cache" if info["cached"] else "workbook"
+        print(f"Loaded #{fidx+1} {Path(info['path']).name} [{info['sheet']}] "
+              f"from {source} in {info['load_seconds']:.2f}s", file=sys.stderr)
+    for (f1_n, fN_n, common_c, u1_c, uN_c, num), pair in zip(summarize(result), result["pairs"]):
+        near = f"{len(pair['near'])} near matches,  " if args.fuzzy is not None else ""
+        common = (f"{common_c} common keys,  {len(pair['matched'])} matched rows,  "
+                  f"{len(pair['changed'])} changed cells"
+                  if pair["key_pairs"] else f"{common_c} common")
+        print(f"{f1_n} vs {fN_n}:  {common},  {near}"
+              f"{u1_c} unique to #1,  {uN_c} unique to #{num}", file=sys.stderr)
+    if result["nway"]:
+        nway = result["nway"]
+        print(f"All files:  {len(nway['in_all'])} in every file", file=sys.stderr)
+        for fidx in nway["files"]:
+            print(f"  #{fidx+1} {Path(file_configs[fidx]['path']).name}:  "
+                  f"{len(nway['only_in'][fidx])} only here,  "
+                  f"{len(nway['missing_from'][fidx])} missing here", file=sys.stderr)
+    if args.timings:
+        for name, calls, seconds, slowest in totals(spans):
+            print(f"  {name:<28}{calls:>5} calls  {seconds:8.3f}s  (slowest {slowest:.3f}s)",
+                  file=sys.stderr)
+    print(f"Compared in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,165 @@
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+from utils import export
+from utils.column import Column
+from utils.comparison import collect_col_data, keyed_join, attribute_changes
+from utils.engine import compare_keyed
+from utils.excel import guess_header_row
+from utils.fuzzy import Cancelled, fuzzy_matches
+from utils.text import normalize
+
+
+def collect_col_data_loop(df, col_name, header_row):
+    if col_name not in df.columns:
+        return {}
+    result = {}
+    for idx, val in df[col_name].dropna().items():
+        v = normalize(val)
+        if v and v.lower() != "nan":
+            result[header_row + 2 + idx] = v
+    return result
+
+
+COLUMNS = {
+    "text": ["  A11-01 ", "A11\xa001", "A11\u200b01", "A\x0111", "A11\t\t01", "nan", "NaN",
+             "", "   ", None, "x  y   z", "Ünïcödé  tag", "\r\nline\nbreak", "ok"],
+    "mixed": [1, 2.0, 2.5, True, False, "nan", np.nan, None, datetime(2024, 1, 2, 3, 4, 5),
+              pd.Timestamp("2024-05-06 07:08:09.123456"), "  7 ", -0.0, 1e20, "\x00"],
+    "int": list(range(-3, 11)),
+    "float": [0.0, 1.0, 1.5, -2.25, np.nan, 1e-7, 3.0, 1e16, np.inf, 100.0, 0.1, 2.0, 7.5,
+              np.nan],
+    "bool": [True, False] * 7,
+    "datetime": pd.to_datetime(["2024-01-02 00:00:00", "2024-01-02 03:04:05", None,
+                                "1999-12-31 23:59:59"] * 3
+                               + ["2000-01-01 00:00:00", "2001-02-03 00:00:00"]),
+    "datetime_us": pd.to_datetime(["2024-01-02 03:04:05.250", None] * 7),
+}
+
+
+@pytest.mark.parametrize("header_row", [0, 3])
+@pytest.mark.parametrize("col_name", list(COLUMNS))
+def test_collect_col_data_matches_per_cell_loop(col_name, header_row):
+    df = pd.DataFrame(COLUMNS)
+    assert dict(collect_col_data(df, col_name, header_row).items()) == \
+        collect_col_data_loop(df, col_name, header_row)
+
+
+def test_collect_col_data_row_numbers():
+    df = pd.DataFrame({"Tag": [" A1", None, "nan", "B2 "]})
+    assert dict(collect_col_data(df, "Tag", 5).items()) == {7: "A1", 10: "B2"}
+
+
+def test_collect_col_data_missing_column():
+    assert dict(collect_col_data(pd.DataFrame({"Tag": ["A1"]}), "Panel", 0).items()) == {}
+
+
+def test_guess_header_row_skips_title_rows():
+    rows = [("Project cable schedule, sheet 1",), (), (),
+            ("Tag", "From", "To", "Cores"),
+            ("C-000001", "DB-1", "MCC-2", 4), ("C-000002", "DB-3", "JB-7", 2)]
+    assert guess_header_row(rows) == 3
+    assert guess_header_row(rows, {0}) == 0
+
+
+def test_guess_header_row_headerless_sheet():
+    assert guess_header_row([(f"L{r}", r * 7) for r in range(20)]) is None
+    assert guess_header_row([]) is None
+
+
+def test_write_xlsx_continues_long_blocks_on_new_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "MAX_ROWS", 10)
+    result = {"file_configs": [{"path": "a.xlsx"}, {"path": "b.xlsx"}],
+              "files": {0: {"path": "a.xlsx", "sheet": "S", "load_seconds": 0.0}},
+              "nway": None,
+              "pairs": [{"index": 1, "col_pairs": [("Tag", "Tag")], "near": [], "key_pairs": [],
+                         "common": {f"C{i}" for i in range(5)},
+                         "rows_only_1": {r: {"Tag": f"A{r}"} for r in range(2, 27)},
+                         "rows_only_N": {}}]}
+    export.write_xlsx(result, tmp_path / "out.xlsx")
+    wb = load_workbook(tmp_path / "out.xlsx")
+    assert wb.sheetnames[:3] == ["Summary", "1 vs 2 b.xlsx", "1 vs 2 b.xlsx (2)"]
+    assert all(ws.max_row <= 10 for ws in wb)
+    pair_rows = [row for ws in wb.worksheets[1:] for row in ws.iter_rows(values_only=True)]
+    assert [row[1] for row in pair_rows if row[0] in range(2, 27)] == \
+        [f"A{r}" for r in range(2, 27)]
+    assert {row[0] for row in pair_rows} >= {f"C{i}" for i in range(5)}
+    assert wb.worksheets[2]["A1"].value == "Only in a.xlsx (continued)"
+    assert wb.worksheets[2]["B2"].value == "Tag"
+
+
+def test_write_xlsx_escapes_quotes_in_sheet_titles(tmp_path):
+    path = 'rev "B" <1&2>.xlsx'
+    result = {"file_configs": [{"path": "a.xlsx"}, {"path": path}],
+              "files": {0: {"path": "a.xlsx", "sheet": "S", "load_seconds": 0.0}},
+              "nway": None,
+              "pairs": [{"index": 1, "col_pairs": [("Tag", "Tag")], "near": [], "key_pairs": [],
+                         "common": {"C1"}, "rows_only_1": {}, "rows_only_N": {2: {"Tag": "B2"}}}]}
+    export.write_xlsx(result, tmp_path / "out.xlsx")
+    wb = load_workbook(tmp_path / "out.xlsx")
+    assert wb.sheetnames == ["Summary", '1 vs 2 rev "B" <1&2>.xlsx']
+
+
+def keyed_columns():
+    tag_1 = Column.from_pairs([2, 3, 4, 5], ["P1", "P1", "P2", "P3"])
+    core_1 = Column.from_pairs([2, 3, 5], ["X", "X", "Z"])
+    tag_N = Column.from_pairs([7, 8, 9], ["P1", "P2", "P3"])
+    core_N = Column.from_pairs([7, 9], ["X", "Z"])
+    return [tag_1, core_1], [tag_N, core_N]
+
+
+def test_keyed_join_pairs_duplicates_in_order_and_blank_parts():
+    rows_1, rows_N, pos, common = keyed_join(*keyed_columns())
+    assert rows_1.tolist() == [2, 3, 4, 5] and rows_N.tolist() == [7, 8, 9]
+    assert pos.tolist() == [0, -1, 1, 2]
+    assert common == ["P1 | X", "P2 | ", "P3 | Z"]
+
+
+def test_keyed_join_one_empty_side():
+    empty = Column.from_pairs([], [])
+    key_columns_1, _ = keyed_columns()
+    rows_1, rows_N, pos, common = keyed_join(key_columns_1, [empty, empty])
+    assert rows_1.tolist() == [2, 3, 4, 5] and rows_N.tolist() == []
+    assert pos.tolist() == [-1] * 4 and common == []
+
+
+def test_compare_keyed_composite_key_with_no_values():
+    empty = Column.from_pairs([], [])
+    pair = compare_keyed({"Tag": empty, "Core": empty}, {"Tag": empty, "Core": empty},
+                         [("Tag", "Tag"), ("Core", "Core")])
+    assert pair["common"] == set() and pair["matched"] == [] and pair["changed"] == []
+    assert pair["rows_only_1"] == {} and pair["rows_only_N"] == {}
+
+
+def test_attribute_changes_reports_changed_and_blanked_values():
+    key_columns_1, key_columns_N = keyed_columns()
+    rows_1, rows_N, pos, _ = keyed_join(key_columns_1, key_columns_N)
+    hit = pos >= 0
+    length_1 = Column.from_pairs([2, 3, 4, 5], ["10", "11", "12", "13"])
+    length_N = Column.from_pairs([7, 8], ["10", "99"])
+    assert attribute_changes(key_columns_1, [("Length", length_1, length_N)], rows_1[hit],
+                             rows_N[pos[hit]]) == \
+        [("P2 | ", 4, 8, "Length", "12", "99"), ("P3 | Z", 5, 9, "Length", "13", "")]
+    assert attribute_changes(key_columns_1, [], rows_1[hit], rows_N[pos[hit]]) == []
+
+
+def test_fuzzy_matches_pairs_each_value_once_best_first():
+    matches = fuzzy_matches(["MCC-01 A", "C-000123", "", "DB-2"],
+                            ["c000123a", "mcc01a", "db 2 ", "C-000124"], 0.6)
+    assert [(i, j) for i, j, _ in matches] == [(0, 1), (3, 2), (1, 0)]
+    assert matches[0][2] == 1.0 and 0.6 <= matches[2][2] < 1.0
+
+
+def test_fuzzy_matches_sequential_ids_below_threshold():
+    ids = range(20000)
+    assert fuzzy_matches([f"C-{i:06d}" for i in ids], [f"X-{i:06d}" for i in ids], 0.8) == []
+
+
+def test_fuzzy_matches_stops_when_cancelled():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(Cancelled):
+        fuzzy_matches(["A11-01"], ["A11-02"], cancel=cancel)
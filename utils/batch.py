@@ -0,0 +1,93 @@
+from pathlib import Path
+from utils.cache import evict
+from utils.engine import (iter_comparison, iter_files, extract_file, mapped_columns, split_keys,
+                          compare_mapped)
+from utils.fuzzy import Cancelled
+from utils.index import workbook_paths
+from utils.timing import span, extend
+
+
+def template_mappings(columns, n_files):
+    return {i: [(c, c) for c in columns] for i in range(1, n_files)}
+
+
+def batch_configs(reference, targets):
+    template_config = {"sheet": reference["sheet"], "header_row": reference["header_row"],
+                       "columns": list(reference["columns"])}
+    reference_path = str(Path(reference["path"]).resolve())
+    file_configs = [reference] + [{"path": p, **template_config}
+                                  for p in dict.fromkeys(workbook_paths(targets))
+                                  if p != reference_path]
+    mappings = template_mappings(template_config["columns"], len(file_configs))
+    return file_configs, mappings, template_config
+
+
+def template_status(v):
+    if v is None:
+        return ""
+    problems = []
+    if not v["sheet_found"]:
+        problems.append(f"sheet '{v['expected_sheet']}' not found")
+    if v["missing"]:
+        problems.append(f"missing {', '.join(v['missing'])}")
+    return "; ".join(problems) or "ok"
+
+
+def batch_row(fidx, cfg, info=None, pair=None, error=None):
+    v = info["validation"] if info else None
+    return {"index": fidx, "path": cfg["path"], "sheet": info["sheet"] if info else None,
+            "template": "error" if error else template_status(v),
+            "missing": v["missing"] if v else [],
+            "common": len(pair["common"]) if pair else None,
+            "only_in_1": len(pair["rows_only_1"]) if pair else None,
+            "only_in_N": len(pair["rows_only_N"]) if pair else None,
+            "changed": len(pair["changed"]) if pair and pair["key_pairs"] else None,
+            "load_seconds": info["load_seconds"] if info else None,
+            "error": str(error) if error else None}
+
+
+def slim_info(info):
+    return {k: info[k] for k in ("path", "sheet", "cached", "validation", "load_seconds")}
+
+
+def iter_batch(file_configs, mappings, template_config, engine=None, workers=None, cancel=None,
+               use_cache=True, fuzzy=None, keys=()):
+    columns = mapped_columns(mappings)
+    reference = extract_file(file_configs[0], columns[0], engine, use_cache)
+    extend(reference["timings"])
+    yield "file", 0, slim_info(reference)
+    del columns[0]
+    for fidx, info in iter_files(file_configs, columns, engine, workers, cancel, use_cache,
+                                 template_config, skip_errors=True):
+        if isinstance(info, Exception):
+            yield "row", fidx, batch_row(fidx, file_configs[fidx], error=info)
+            continue
+        extend(info["timings"])
+        col_pairs = mappings[fidx]
+        key_pairs, attr_pairs = split_keys(col_pairs, keys)
+        try:
+            with span("compare_pair", file=Path(info["path"]).name):
+                pair = compare_mapped({c1: reference["col_data"][c1] for c1, _ in col_pairs},
+                                      {cN: info["col_data"][cN] for _, cN in col_pairs},
+                                      key_pairs, attr_pairs, fuzzy, cancel)
+        except Cancelled:
+            return
+        pair.update(key_pairs=key_pairs, index=fidx, col_pairs=col_pairs)
+        yield "file", fidx, slim_info(info)
+        yield "pair", fidx, pair
+        yield "row", fidx, batch_row(fidx, file_configs[fidx], info, pair)
+    if use_cache:
+        evict()
+
+
+def batch_detail(file_configs, mappings, template_config, fidx, engine=None, fuzzy=None,
+                 keys=()):
+    files, pair = {}, None
+    for kind, i, payload in iter_comparison(file_configs, {fidx: mappings[fidx]}, engine, 1,
+                                            template_config=template_config, fuzzy=fuzzy,
+                                            keys=keys):
+        if kind == "file":
+            files[i] = payload
+        elif kind == "pair":
+            pair = payload
+    return files[fidx], pair
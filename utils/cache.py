@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import sys
+from importlib.util import find_spec
+from pathlib import Path
+from utils.column import Column
+
+ENABLED = find_spec("pyarrow") is not None
+SIZE_LIMIT = int(os.environ.get("ECC_CACHE_LIMIT_MB", "512")) * 1024 * 1024
+
+
+def cache_dir():
+    if os.environ.get("ECC_CACHE_DIR"):
+        return Path(os.environ["ECC_CACHE_DIR"])
+    if sys.platform == "win32":
+        base = Path(os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local"))
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return base / "ExcelColumnComparator"
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return [str(Path(path).resolve()), st.st_size, st.st_mtime_ns]
+
+
+def entry_path(path, sheet, header_row, column):
+    key = json.dumps(fingerprint(path) + [sheet, header_row, column])
+    return cache_dir() / f"{hashlib.sha1(key.encode()).hexdigest()}.parquet"
+
+
+def get_column(path, sheet, header_row, column):
+    if not ENABLED:
+        return None
+    import pandas as pd
+    import pyarrow.parquet as pq
+    entry = entry_path(path, sheet, header_row, column)
+    try:
+        table = pq.read_table(entry)
+        os.utime(entry)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        entry.unlink(missing_ok=True)
+        return None
+    rows = table.column("row").to_numpy()
+    values = pd.arrays.ArrowStringArray(table.column("value"))
+    return table.schema.metadata[b"sheet"].decode(), Column.from_pairs(rows, values)
+
+
+def put_column(path, sheet, header_row, column, resolved_sheet, col_data):
+    if not ENABLED:
+        return
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    entry = entry_path(path, sheet, header_row, column)
+    values = pa.DictionaryArray.from_arrays(pa.array(col_data.codes),
+                                            pa.array(col_data.dictionary.tolist(), pa.string()))
+    table = pa.table({"row": pa.array(col_data.rows, pa.int64()), "value": values},
+                     metadata={"sheet": resolved_sheet})
+    tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, tmp)
+        os.replace(tmp, entry)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+
+def evict(limit=SIZE_LIMIT):
+    entries = []
+    for entry in cache_dir().glob("*.parquet"):
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= limit:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
+def clear():
+    evict(0)
@@ -0,0 +1,51 @@
+from collections.abc import Mapping
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray
+
+
+class Column(Mapping):
+    def __init__(self, rows, codes, dictionary):
+        self.rows = rows
+        self.codes = codes
+        self.dictionary = dictionary
+
+    @classmethod
+    def from_pairs(cls, rows, values):
+        if not isinstance(values, (pd.Series, ExtensionArray, np.ndarray)):
+            values = np.asarray(values, dtype=object)
+        codes, dictionary = pd.factorize(values)
+        return cls(np.asarray(rows, dtype=np.int64), codes.astype(np.int32),
+                   pd.Index(dictionary).array)
+
+    def __repr__(self):
+        return f"Column({len(self.rows)} rows, {len(self.dictionary)} distinct)"
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows.tolist())
+
+    def __getitem__(self, row):
+        i = np.searchsorted(self.rows, row)
+        if i < len(self.rows) and self.rows[i] == row:
+            return self.dictionary[self.codes[i]]
+        raise KeyError(row)
+
+    def values(self):
+        return self.dictionary.take(self.codes).to_numpy().tolist()
+
+    def items(self):
+        return zip(self.rows.tolist(), self.values())
+
+    def to_series(self):
+        return pd.Series(self.dictionary.take(self.codes), index=self.rows)
+
+
+def encode(dictionaries):
+    combined = pd.concat([pd.Series(d, copy=False) for d in dictionaries if len(d)]
+                         or [pd.Series([], dtype=object)], ignore_index=True)
+    codes, uniques = pd.factorize(combined)
+    bounds = np.cumsum([len(d) for d in dictionaries])[:-1]
+    return np.split(codes, bounds), pd.Index(uniques).array
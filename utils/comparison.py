@@ -1,26 +1,49 @@
-from utils.text import normalize
+import numpy as np
+import pandas as pd
+from utils.column import Column, encode
+from utils.text import normalize_series
+from utils.timing import timed
+
+
+@timed
+def series_col_data(series):
+    values = normalize_series(series.dropna())
+    values = values[(values != "") & (values.str.lower() != "nan")]
+    return Column.from_pairs(values.index.to_numpy(), values)
 
 
 def collect_col_data(df, col_name, header_row):
     if col_name not in df.columns:
-        return {}
-    result = {}
-    for idx, val in df[col_name].dropna().items():
-        v = normalize(val)
-        if v and v.lower() != "nan":
-            result[header_row + 2 + idx] = v
-    return result
+        return Column.from_pairs([], [])
+    return series_col_data(df[col_name].set_axis(df.index + header_row + 2))
 
 
-def get_rows_with_unique_values(col_data, unique_values):
+def gather_rows(col_data, hits):
     rows = {}
-    for col_name, data in col_data.items():
-        for excel_row, val in data.items():
-            if val in unique_values:
-                rows.setdefault(excel_row, {})[col_name] = val
+    for (col_name, data), hit in zip(col_data.items(), hits):
+        for excel_row, val in zip(data.rows[hit].tolist(),
+                                  data.dictionary.take(data.codes[hit]).to_numpy().tolist()):
+            rows.setdefault(excel_row, {})[col_name] = val
     return rows
 
 
+@timed
+def rows_where(col_data, dictionary_masks):
+    return gather_rows(col_data, [wanted[data.codes]
+                                  for data, wanted in zip(col_data.values(), dictionary_masks)])
+
+
+@timed
+def rows_in(col_data, excel_rows):
+    return gather_rows(col_data, [np.isin(data.rows, excel_rows) for data in col_data.values()])
+
+
+def get_rows_with_unique_values(col_data, unique_values):
+    unique_values = np.asarray(list(unique_values), dtype=object)
+    return rows_where(col_data, [np.asarray(pd.Index(data.dictionary).isin(unique_values))
+                                 for data in col_data.values()])
+
+
 def matches_search_pattern(text, pattern):
     text = text.lower()
     pattern = pattern.lower()
@@ -38,3 +61,97 @@ def row_matches_search(values, pattern):
         if matches_search_pattern(str(val), pattern):
             return True
     return False
+
+
+def key_parts(key_columns, dictionary_codes):
+    rows = np.sort(pd.unique(np.concatenate([data.rows for data in key_columns])))
+    parts = []
+    for data, codes in zip(key_columns, dictionary_codes):
+        part = np.full(len(rows), -1, dtype=np.int64)
+        part[np.searchsorted(rows, data.rows)] = codes[data.codes]
+        parts.append(part)
+    return rows, parts
+
+
+def composite_codes(parts):
+    combined = parts[0]
+    for part in parts[1:]:
+        combined, _ = pd.factorize(combined * (int(part.max(initial=-1)) + 2) + part + 1)
+    return combined
+
+
+def occurrences(keys):
+    return pd.Series(keys).groupby(keys, sort=False).cumcount().to_numpy()
+
+
+@timed
+def keyed_join(key_columns_1, key_columns_N):
+    codes, uniques = encode([data.dictionary for data in key_columns_1 + key_columns_N])
+    rows_1, parts_1 = key_parts(key_columns_1, codes[:len(key_columns_1)])
+    rows_N, parts_N = key_parts(key_columns_N, codes[len(key_columns_1):])
+    keys = composite_codes([np.concatenate(pair) for pair in zip(parts_1, parts_N)])
+    keys_1, keys_N = keys[:len(rows_1)], keys[len(rows_1):]
+    occurrence_1, occurrence_N = occurrences(keys_1), occurrences(keys_N)
+    width = int(max(occurrence_1.max(initial=0), occurrence_N.max(initial=0))) + 1
+    pos = pd.Index(keys_N * width + occurrence_N).get_indexer(keys_1 * width + occurrence_1)
+    hit = (pos >= 0).nonzero()[0]
+    first = hit[np.unique(keys_1[hit], return_index=True)[1]]
+    labels = np.append(uniques.to_numpy(dtype=object), "")
+    return rows_1, rows_N, pos, key_text([labels[part[first]] for part in parts_1])
+
+
+def key_text(parts):
+    text = parts[0]
+    for part in parts[1:]:
+        text = text + " | " + part
+    return text.tolist()
+
+
+def codes_at(data, excel_rows, codes):
+    pos = np.searchsorted(data.rows, excel_rows)
+    found = pos < len(data.rows)
+    found[found] = data.rows[pos[found]] == excel_rows[found]
+    out = np.full(len(excel_rows), -1, dtype=np.int64)
+    out[found] = codes[data.codes[pos[found]]]
+    return out
+
+
+def text_at(data, excel_rows):
+    labels = np.append(data.dictionary.to_numpy(dtype=object), "")
+    return labels[codes_at(data, excel_rows, np.arange(len(data.dictionary)))]
+
+
+@timed
+def attribute_changes(key_columns, attr_columns, rows_1, rows_N):
+    frames = []
+    for label, data_1, data_N in attr_columns:
+        (codes_1, codes_N), uniques = encode([data_1.dictionary, data_N.dictionary])
+        old, new = codes_at(data_1, rows_1, codes_1), codes_at(data_N, rows_N, codes_N)
+        hit = (old != new).nonzero()[0]
+        labels = np.append(uniques.to_numpy(dtype=object), "")
+        frames.append(pd.DataFrame({"row_1": rows_1[hit], "row_N": rows_N[hit], "column": label,
+                                    "old": labels[old[hit]], "new": labels[new[hit]]}))
+    if not frames:
+        return []
+    changed = pd.concat(frames, ignore_index=True).sort_values("row_1", kind="stable")
+    keys = key_text([text_at(data, changed["row_1"].to_numpy()) for data in key_columns])
+    return list(zip(keys, changed["row_1"].tolist(), changed["row_N"].tolist(),
+                    changed["column"].tolist(), changed["old"].tolist(), changed["new"].tolist()))
+
+
+def presence_masks(file_columns):
+    owners = [fidx for fidx, columns in file_columns.items() for _ in columns]
+    codes, uniques = encode([c.dictionary for columns in file_columns.values() for c in columns])
+    masks = np.zeros(len(uniques), dtype=np.int64 if max(file_columns) < 62 else object)
+    for fidx, column_codes in zip(owners, codes):
+        masks[column_codes] |= 1 << fidx
+    return uniques, masks, codes
+
+
+def group_by_mask(uniques, masks):
+    return {int(mask): uniques[masks == mask].tolist() for mask in pd.unique(masks)}
+
+
+def missing_from(groups, subset):
+    subset_mask = sum(1 << fidx for fidx in subset)
+    return {v for mask, values in groups.items() if not mask & subset_mask for v in values}
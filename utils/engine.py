@@ -0,0 +1,308 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import chain
+from pathlib import Path
+import numpy as np
+from utils.column import Column
+from utils.fuzzy import fuzzy_matches, Cancelled
+from utils.excel import WorkbookSession, validate_against_template, should_stream
+from utils.comparison import (collect_col_data, series_col_data, rows_where, rows_in,
+                              keyed_join, attribute_changes, presence_masks, group_by_mask,
+                              missing_from)
+from utils.cache import get_column, put_column, evict, fingerprint
+from utils.timing import span, record, mark, take, extend
+
+
+def mapped_columns(mappings):
+    columns = {0: []}
+    for fidx, col_pairs in sorted(mappings.items()):
+        cols_N = columns.setdefault(fidx, [])
+        for c1, cN in col_pairs:
+            if c1 not in columns[0]:
+                columns[0].append(c1)
+            if cN not in cols_N:
+                cols_N.append(cN)
+    return columns
+
+
+def affected_mappings(file_configs, mappings, paths):
+    changed = {fidx for fidx, cfg in enumerate(file_configs) if cfg["path"] in paths}
+    if 0 in changed:
+        return dict(mappings)
+    return {fidx: col_pairs for fidx, col_pairs in mappings.items() if fidx in changed}
+
+
+def compare_pair(col_data_1, col_data_N, fuzzy=None, cancel=None):
+    uniques, masks, codes = presence_masks({0: list(col_data_1.values()),
+                                            1: list(col_data_N.values())})
+    codes_1, codes_N = codes[:len(col_data_1)], codes[len(col_data_1):]
+    only_1, only_N = masks == 1, masks == 2
+    near = []
+    if fuzzy is not None:
+        idx_1, idx_N = only_1.nonzero()[0], only_N.nonzero()[0]
+        with span("fuzzy_matches"):
+            matches = fuzzy_matches(uniques.take(idx_1).tolist(), uniques.take(idx_N).tolist(),
+                                    fuzzy, cancel)
+        for i, j, score in matches:
+            only_1[idx_1[i]] = only_N[idx_N[j]] = False
+            near.append((uniques[idx_1[i]], uniques[idx_N[j]], score))
+    return {"common": set(uniques[masks == 3].tolist()), "near": near,
+            "rows_only_1": rows_where(col_data_1, [only_1[c] for c in codes_1]),
+            "rows_only_N": rows_where(col_data_N, [only_N[c] for c in codes_N])}
+
+
+def compare_keyed(col_data_1, col_data_N, key_pairs, attr_pairs=()):
+    key_columns_1 = [col_data_1[c1] for c1, _ in key_pairs]
+    rows_1, rows_N, pos, common = keyed_join(key_columns_1,
+                                             [col_data_N[cN] for _, cN in key_pairs])
+    hit = pos >= 0
+    matched_N = np.zeros(len(rows_N), dtype=bool)
+    matched_N[pos[hit]] = True
+    attr_columns = [(c1 if c1 == cN else f"{c1} / {cN}", col_data_1[c1], col_data_N[cN])
+                    for c1, cN in attr_pairs]
+    return {"common": set(common), "near": [],
+            "matched": list(zip(rows_1[hit].tolist(), rows_N[pos[hit]].tolist())),
+            "changed": attribute_changes(key_columns_1, attr_columns, rows_1[hit],
+                                         rows_N[pos[hit]]),
+            "rows_only_1": rows_in(col_data_1, rows_1[~hit]),
+            "rows_only_N": rows_in(col_data_N, rows_N[~matched_N])}
+
+
+def split_keys(col_pairs, keys):
+    return ([(c1, cN) for c1, cN in col_pairs if c1 in keys],
+            [(c1, cN) for c1, cN in col_pairs if c1 not in keys])
+
+
+def compare_mapped(col_data_1, col_data_N, key_pairs, attr_pairs, fuzzy=None, cancel=None):
+    if key_pairs:
+        return compare_keyed(col_data_1, col_data_N, key_pairs, attr_pairs)
+    return compare_pair(col_data_1, col_data_N, fuzzy, cancel)
+
+
+def compare_nway(files, columns):
+    file_columns = {fidx: [files[fidx]["col_data"][c] for c in cols]
+                    for fidx, cols in columns.items()}
+    uniques, masks, _ = presence_masks(file_columns)
+    groups = group_by_mask(uniques, masks)
+    full = sum(1 << fidx for fidx in columns)
+    return {"files": sorted(columns), "groups": groups,
+            "in_all": groups.get(full, []),
+            "only_in": {fidx: groups.get(1 << fidx, []) for fidx in columns},
+            "missing_from": {fidx: missing_from(groups, [fidx]) for fidx in columns}}
+
+
+def extract_file(cfg, columns, engine=None, use_cache=True, template_config=None):
+    start, since = time.perf_counter(), mark()
+    path, header_row = cfg["path"], cfg["header_row"]
+    name = Path(path).name
+    file_fingerprint = fingerprint(path)
+    sheet, col_data, validation = None, {}, None
+    if use_cache:
+        with span("cache_read", file=name):
+            for c in columns:
+                hit = get_column(path, cfg["sheet"], header_row, c)
+                if hit is not None:
+                    sheet, col_data[c] = hit
+    missing = [c for c in columns if c not in col_data]
+    if missing or template_config:
+        with WorkbookSession(path, engine) as wb:
+            if missing:
+                sheet = wb.resolve_sheet(cfg["sheet"])
+                if should_stream(path, engine):
+                    streamed = wb.stream_columns(sheet, header_row, missing)
+                    for c in missing:
+                        col_data[c] = (series_col_data(streamed[c]) if c in streamed
+                                       else Column.from_pairs([], []))
+                else:
+                    df = wb.read_dataframe(sheet, header_row, missing)
+                    for c in missing:
+                        col_data[c] = collect_col_data(df, c, header_row)
+                if use_cache:
+                    with span("cache_write", file=name):
+                        for c in missing:
+                            put_column(path, cfg["sheet"], header_row, c, sheet, col_data[c])
+            if template_config:
+                validation = validate_against_template(wb, template_config)
+    load_seconds = time.perf_counter() - start
+    record("extract_file", load_seconds, file=name)
+    return {"path": path, "sheet": sheet, "col_data": col_data, "cached": not missing,
+            "validation": validation, "fingerprint": file_fingerprint,
+            "load_seconds": load_seconds, "timings": take(since)}
+
+
+def iter_files(file_configs, columns, engine=None, workers=None, cancel=None, use_cache=True,
+               template_config=None, skip_errors=False):
+    workers = workers or min(len(columns), os.cpu_count() or 1)
+    if workers <= 1:
+        for fidx, cols in columns.items():
+            if cancel is not None and cancel.is_set():
+                return
+            try:
+                info = extract_file(file_configs[fidx], cols, engine, use_cache,
+                                    template_config if fidx > 0 else None)
+            except Exception as e:
+                if not skip_errors:
+                    raise
+                info = e
+            yield fidx, info
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {pool.submit(extract_file, file_configs[fidx], cols, engine, use_cache,
+                               template_config if fidx > 0 else None): fidx
+                   for fidx, cols in columns.items()}
+        while pending:
+            done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancel is not None and cancel.is_set():
+                return
+            for f in done:
+                error = f.exception()
+                if error is not None and not skip_errors:
+                    raise error
+                yield pending.pop(f), error or f.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def file_key(cfg):
+    return cfg["path"], cfg["sheet"], cfg["header_row"]
+
+
+def template_key(cfg, template_config):
+    return (cfg["path"], template_config["sheet"], template_config["header_row"],
+            tuple(template_config["columns"]))
+
+
+class ComparisonSession:
+    def __init__(self):
+        self.fingerprints = {}
+        self.sheets = {}
+        self.columns = {}
+        self.validations = {}
+        self.pairs = {}
+        self.lock = threading.RLock()
+
+    def invalidate(self, path):
+        with self.lock:
+            self.fingerprints.pop(path, None)
+            for store in (self.sheets, self.columns, self.validations):
+                for key in [k for k in store if k[0] == path]:
+                    del store[key]
+            for key in [k for k in self.pairs if path in (k[0][0], k[1][0])]:
+                del self.pairs[key]
+
+    def to_load(self, file_configs, columns, template_config=None):
+        to_load = {}
+        with self.lock:
+            for fidx, cols in columns.items():
+                cfg = file_configs[fidx]
+                if self.fingerprints.get(cfg["path"]) != fingerprint(cfg["path"]):
+                    self.invalidate(cfg["path"])
+                missing = [c for c in cols if file_key(cfg) + (c,) not in self.columns]
+                unvalidated = (template_config and fidx > 0
+                               and template_key(cfg, template_config) not in self.validations)
+                if missing or unvalidated:
+                    to_load[fidx] = missing
+        return to_load
+
+    def store(self, cfg, info, template_config=None):
+        with self.lock:
+            self.fingerprints[cfg["path"]] = info["fingerprint"]
+            if info["sheet"] is not None:
+                self.sheets[file_key(cfg)] = info["sheet"]
+            for c, data in info["col_data"].items():
+                self.columns[file_key(cfg) + (c,)] = data
+            if template_config:
+                self.validations[template_key(cfg, template_config)] = info["validation"]
+
+    def file_info(self, cfg, cols, template_config=None, loaded=None):
+        key = file_key(cfg)
+        with self.lock:
+            return {"path": cfg["path"], "sheet": self.sheets.get(key),
+                    "col_data": {c: self.columns[key + (c,)] for c in cols},
+                    "cached": loaded["cached"] if loaded else True,
+                    "validation": (self.validations.get(template_key(cfg, template_config))
+                                   if template_config else None),
+                    "load_seconds": loaded["load_seconds"] if loaded else 0.0}
+
+    def compare(self, cfg_1, cfg_N, col_pairs, col_data_1, col_data_N, fuzzy=None, keys=(),
+                cancel=None):
+        key_pairs, attr_pairs = split_keys(col_pairs, keys)
+        key = (file_key(cfg_1), file_key(cfg_N), tuple(col_pairs), fuzzy, tuple(key_pairs))
+        with self.lock:
+            pair = self.pairs.get(key)
+        if pair is None:
+            with span("compare_pair", file=Path(cfg_N["path"]).name):
+                pair = compare_mapped(col_data_1, col_data_N, key_pairs, attr_pairs, fuzzy,
+                                      cancel)
+            with self.lock:
+                self.pairs[key] = pair
+        return dict(pair, key_pairs=key_pairs)
+
+
+def iter_comparison(file_configs, mappings, engine=None, workers=None, cancel=None,
+                    use_cache=True, template_config=None, nway=False, session=None,
+                    fuzzy=None, keys=(), skip_errors=False):
+    session = session or ComparisonSession()
+    files = {}
+    columns = mapped_columns(mappings)
+    waiting = sorted(mappings.items())
+    to_load = session.to_load(file_configs, columns, template_config)
+    in_memory = ((fidx, None) for fidx in columns if fidx not in to_load)
+    for fidx, info in chain(in_memory, iter_files(file_configs, to_load, engine, workers,
+                                                  cancel, use_cache, template_config,
+                                                  skip_errors)):
+        if isinstance(info, Exception):
+            if fidx == 0:
+                raise info
+            yield "error", fidx, info
+            continue
+        cfg, file_template = file_configs[fidx], template_config if fidx > 0 else None
+        if info is not None:
+            extend(info["timings"])
+            session.store(cfg, info, file_template)
+        files[fidx] = session.file_info(cfg, columns[fidx], file_template, info)
+        yield "file", fidx, files[fidx]
+        ready = [(i, cp) for i, cp in waiting if 0 in files and i in files]
+        for i, col_pairs in ready:
+            waiting.remove((i, col_pairs))
+            col_data_1 = {c1: files[0]["col_data"][c1] for c1, _ in col_pairs}
+            col_data_N = {cN: files[i]["col_data"][cN] for _, cN in col_pairs}
+            try:
+                pair = session.compare(file_configs[0], file_configs[i], col_pairs,
+                                       col_data_1, col_data_N, fuzzy, keys, cancel)
+            except Cancelled:
+                return
+            pair.update(index=i, col_pairs=col_pairs)
+            yield "pair", i, pair
+    if nway and len(files) == len(columns):
+        with span("compare_nway"):
+            nway_result = compare_nway(files, columns)
+        yield "nway", None, nway_result
+    if use_cache and to_load:
+        evict()
+
+
+def compare_files(file_configs, mappings, engine=None, workers=None, use_cache=True,
+                  nway=False, session=None, fuzzy=None, keys=()):
+    result = {"file_configs": file_configs, "files": {}, "pairs": [], "nway": None}
+    for kind, fidx, payload in iter_comparison(file_configs, mappings, engine, workers,
+                                               use_cache=use_cache, nway=nway, session=session,
+                                               fuzzy=fuzzy, keys=keys):
+        if kind == "file":
+            result["files"][fidx] = payload
+        elif kind == "pair":
+            result["pairs"].append(payload)
+        else:
+            result["nway"] = payload
+    result["pairs"].sort(key=lambda p: p["index"])
+    return result
+
+
+def summarize(result):
+    f1_name = Path(result["file_configs"][0]["path"]).name
+    return [(f1_name, Path(result["file_configs"][p["index"]]["path"]).name,
+             len(p["common"]), len(p["rows_only_1"]), len(p["rows_only_N"]), p["index"] + 1)
+            for p in result["pairs"]]
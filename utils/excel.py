@@ -1,52 +1,341 @@
+from importlib.util import find_spec
+from pathlib import Path
+import os
+import zipfile
 from openpyxl import load_workbook
+from openpyxl.packaging.relationship import get_rels_path, get_dependents
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.xml.constants import SHEET_MAIN_NS, REL_NS
+from openpyxl.xml.functions import fromstring
 import pandas as pd
+from pandas.io.parsers import TextParser
 from utils.text import normalize
+from utils.timing import span, timed
 
+DEFAULT_ENGINE = "calamine" if find_spec("python_calamine") else "openpyxl"
+STREAM_ABOVE = int(os.environ.get("ECC_STREAM_ABOVE_MB", "50")) * 1024 * 1024
+STREAM_SUFFIXES = (".xlsx", ".xlsm")
 
-def load_dataframe(path, header_row, sheet_name):
-    df = pd.read_excel(path, header=header_row, sheet_name=sheet_name)
+
+def pick_engine(path, engine=None):
+    engine = engine or DEFAULT_ENGINE
+    if engine == "stream":
+        engine = "openpyxl"
+    if engine == "openpyxl" and Path(path).suffix.lower() == ".xls":
+        return None
+    return engine
+
+
+def should_stream(path, engine=None):
+    if Path(path).suffix.lower() not in STREAM_SUFFIXES:
+        return False
+    return engine == "stream" or (engine is None and os.path.getsize(path) > STREAM_ABOVE)
+
+
+HEAD_ROWS = 50
+HEAD_COLS = 40
+FILTER_DATABASE = "_xlnm._FilterDatabase"
+filter_rows_cache = {}
+
+
+def projection(columns):
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return lambda c: normalize(c) in wanted
+
+
+def convert_cell(cell):
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return float("nan")
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        return val if val == cell.value else float(cell.value)
+    return cell.value
+
+
+def parse_column(rows, values, has_gap):
+    data = [[r, v] for r, v in zip(rows, values)]
+    if has_gap:
+        data.append([0, ""])
+    if not data:
+        return pd.Series(dtype=object)
+    return TextParser(data, header=None, index_col=0).read()[1]
+
+
+@timed
+def load_dataframe(path, header_row, sheet_name, columns=None, engine=None):
+    df = pd.read_excel(path, header=header_row, sheet_name=sheet_name,
+                       usecols=projection(columns), engine=pick_engine(path, engine))
     df.columns = [normalize(c) for c in df.columns]
     return df
 
 
+class WorkbookSession:
+    def __init__(self, path, engine=None):
+        self.path = path
+        with span("open_workbook", file=Path(path).name):
+            self.excel = pd.ExcelFile(path, engine=pick_engine(path, engine))
+        self.wb = self.excel.book if self.excel.engine == "openpyxl" else None
+        self.head = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        if self.wb is not None and self.excel.engine != "openpyxl":
+            self.wb.close()
+        self.excel.close()
+
+    @property
+    def sheetnames(self):
+        return self.excel.sheet_names
+
+    @property
+    def workbook(self):
+        if self.wb is None:
+            self.wb = load_workbook(self.path, data_only=True, read_only=True)
+        return self.wb
+
+    def resolve_sheet(self, preferred_sheet):
+        return preferred_sheet if preferred_sheet in self.sheetnames else self.sheetnames[0]
+
+    def head_rows(self, sheet_name):
+        if sheet_name not in self.head:
+            with span("head_rows", file=Path(self.path).name):
+                if Path(self.path).suffix.lower() == ".xls":
+                    df = self.excel.parse(sheet_name, header=None, nrows=HEAD_ROWS)
+                    self.head[sheet_name] = [tuple(None if pd.isna(v) else v for v in row)
+                                             for row in df.iloc[:, :HEAD_COLS].itertuples(index=False)]
+                else:
+                    ws = self.workbook[sheet_name]
+                    self.head[sheet_name] = list(ws.iter_rows(max_row=HEAD_ROWS,
+                                                              max_col=HEAD_COLS,
+                                                              values_only=True))
+        return self.head[sheet_name]
+
+    def row_values(self, sheet_name, row_index):
+        if row_index < HEAD_ROWS:
+            rows = self.head_rows(sheet_name)
+            return rows[row_index] if row_index < len(rows) else ()
+        ws = self.workbook[sheet_name]
+        for row in ws.iter_rows(min_row=row_index + 1, max_row=row_index + 1,
+                                max_col=HEAD_COLS, values_only=True):
+            return row
+        return ()
+
+    def columns_at_row(self, sheet_name, row_index):
+        return [normalize(v) for v in self.row_values(sheet_name, row_index) if v is not None]
+
+    @timed
+    def find_header_row(self, sheet_name, expected_columns):
+        expected_lower = {c.lower() for c in expected_columns}
+        best_row, best_match = None, 0
+        for row_idx, row in enumerate(self.head_rows(sheet_name)):
+            row_vals = {normalize(v).lower() for v in row if v is not None}
+            match_count = len(expected_lower & row_vals)
+            if match_count > best_match:
+                best_match, best_row = match_count, row_idx
+        return best_row if best_match >= max(1, len(expected_lower) * 0.5) else None
+
+    def stream_columns(self, sheet_name, header_row, columns):
+        with span("stream_columns", file=Path(self.path).name):
+            ws = self.workbook[sheet_name]
+            if isinstance(ws, ReadOnlyWorksheet):
+                ws.reset_dimensions()
+            rows = ws.iter_rows(min_row=header_row + 1)
+            positions = {}
+            for i, cell in enumerate(next(rows, ())):
+                positions.setdefault(normalize(convert_cell(cell)), i)
+            wanted = {c: positions[c] for c in columns if c in positions}
+            found = {c: ([], []) for c in wanted}
+            last_row = header_row + 1
+            for excel_row, row in enumerate(rows, header_row + 2):
+                if any(cell.value is not None and cell.value != "" for cell in row):
+                    last_row = excel_row
+                for c, i in wanted.items():
+                    if i < len(row) and row[i].value is not None and row[i].value != "":
+                        found[c][0].append(excel_row)
+                        found[c][1].append(convert_cell(row[i]))
+            n_rows = last_row - header_row - 1
+            return {c: parse_column(found_rows, values, len(found_rows) < n_rows)
+                    for c, (found_rows, values) in found.items()}
+
+    def read_dataframe(self, sheet_name, header_row, columns=None):
+        with span("read_dataframe", file=Path(self.path).name):
+            df = self.excel.parse(sheet_name, header=header_row, usecols=projection(columns))
+        df.columns = [normalize(c) for c in df.columns]
+        return df
+
+
+@timed
+def open_preview(path):
+    return load_workbook(path, data_only=True, read_only=True)
+
+
 def resolve_sheet_name(file_path, preferred_sheet):
-    wb = load_workbook(file_path, data_only=True, read_only=True)
-    result = preferred_sheet if preferred_sheet in wb.sheetnames else wb.sheetnames[0]
-    wb.close()
-    return result
+    with WorkbookSession(file_path) as wb:
+        return wb.resolve_sheet(preferred_sheet)
+
+
+@timed
+def validate_against_template(wb, template_config):
+    expected_row = template_config["header_row"]
+    template_cols = template_config["columns"]
+    template_sheet = template_config["sheet"]
+    sheet_found = template_sheet in wb.sheetnames
+    actual_sheet = wb.resolve_sheet(template_sheet)
+    actual_cols = wb.columns_at_row(actual_sheet, expected_row)
+    missing = [c for c in template_cols if c not in actual_cols]
+    extra = [c for c in actual_cols if c not in template_cols]
+    actual_row = None
+    if missing:
+        found = wb.find_header_row(actual_sheet, template_cols)
+        actual_row = (found + 1) if found is not None else None
+    return {"expected_row": expected_row + 1, "missing": missing, "extra": extra,
+            "actual_row": actual_row, "sheet_found": sheet_found,
+            "expected_sheet": template_sheet, "actual_sheet": actual_sheet}
+
+
+def ref_header_row(ref):
+    return int(ref.split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ$")) - 1
+
+
+def table_refs(archive, sheet_path):
+    rels_path = get_rels_path(sheet_path)
+    if rels_path not in archive.namelist():
+        return []
+    return [fromstring(archive.read(rel.target)).get("ref")
+            for rel in get_dependents(archive, rels_path) if rel.Type.endswith("/table")]
+
+
+def read_filter_rows(path):
+    if Path(path).suffix.lower() not in STREAM_SUFFIXES:
+        return {}
+    with zipfile.ZipFile(path) as archive:
+        workbook_path = next(rel.target for rel in get_dependents(archive, "_rels/.rels")
+                             if rel.Type.endswith("/officeDocument"))
+        root = fromstring(archive.read(workbook_path))
+        sheet_paths = {rel.Id: rel.target
+                       for rel in get_dependents(archive, get_rels_path(workbook_path))}
+        named = {}
+        for name in root.iter(f"{{{SHEET_MAIN_NS}}}definedName"):
+            if name.get("name") == FILTER_DATABASE and name.get("localSheetId") and name.text:
+                named.setdefault(int(name.get("localSheetId")), []).append(
+                    name.text.split("!")[-1])
+        found = {}
+        for i, sheet in enumerate(root.iter(f"{{{SHEET_MAIN_NS}}}sheet")):
+            sheet_path = sheet_paths[sheet.get(f"{{{REL_NS}}}id")]
+            refs = table_refs(archive, sheet_path) + named.get(i, [])
+            found[sheet.get("name")] = {ref_header_row(ref) for ref in refs if ref}
+    return found
+
+
+def filter_rows_key(path):
+    stat = os.stat(path)
+    return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def cached_filter_rows(path):
+    return filter_rows_cache.get(filter_rows_key(path))
+
+
+@timed
+def workbook_filter_rows(path):
+    key = filter_rows_key(path)
+    if key not in filter_rows_cache:
+        filter_rows_cache[key] = read_filter_rows(path)
+    return filter_rows_cache[key]
 
 
 def get_filter_header_rows(ws):
-    header_rows = set()
-    for table in ws.tables.values():
-        row_number = int(table.ref.split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
-        header_rows.add(row_number - 1)
+    if isinstance(ws, ReadOnlyWorksheet):
+        return workbook_filter_rows(ws.parent._archive.filename).get(ws.title, set())
+    refs = [table.ref for table in ws.tables.values()]
     if ws.auto_filter and ws.auto_filter.ref:
-        row_number = int(ws.auto_filter.ref.split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
-        header_rows.add(row_number - 1)
-    return header_rows
+        refs.append(ws.auto_filter.ref)
+    return {ref_header_row(ref) for ref in refs if ref}
 
 
 def get_columns_at_row(file_path, sheet_name, row_index):
-    wb = load_workbook(file_path, data_only=True, read_only=True)
-    ws = wb[sheet_name]
-    result = []
-    for i, row in enumerate(ws.iter_rows(max_row=row_index + 1, max_col=40)):
-        if i == row_index:
-            result = [normalize(c.value) for c in row if c.value is not None]
-    wb.close()
-    return result
+    with WorkbookSession(file_path) as wb:
+        return wb.columns_at_row(sheet_name, row_index)
 
 
 def find_actual_header_row(file_path, sheet_name, expected_columns):
-    expected_lower = {c.lower() for c in expected_columns}
-    wb = load_workbook(file_path, data_only=True, read_only=True)
-    ws = wb[sheet_name]
-    best_row, best_match = None, 0
-    for row_idx, row in enumerate(ws.iter_rows(max_row=50, max_col=40)):
-        row_vals = {normalize(c.value).lower() for c in row if c.value is not None}
-        match_count = len(expected_lower & row_vals)
-        if match_count > best_match:
-            best_match, best_row = match_count, row_idx
-    wb.close()
-    return best_row if best_match >= max(1, len(expected_lower) * 0.5) else None
+    with WorkbookSession(file_path) as wb:
+        return wb.find_header_row(sheet_name, expected_columns)
+
+
+def header_score(rows, i, expected, filter_rows):
+    cells = [(j, v) for j, v in enumerate(rows[i]) if v is not None and normalize(v)]
+    texts = [normalize(v).lower() for _, v in cells if isinstance(v, str)]
+    if not texts:
+        return 0.0
+    wordy = sum(0.5 if any(ch.isdigit() for ch in t) else 1.0 for t in texts)
+    distinct = len(set(texts)) / len(cells)
+    below = rows[i + 1:i + 4]
+    filled = sum(any(j < len(r) and r[j] is not None for r in below) for j, _ in cells) / len(cells)
+    return (wordy * distinct * (0.25 + filled) + 3 * len(expected & set(texts))
+            + (HEAD_COLS / 4 if i in filter_rows else 0))
+
+
+def looks_like_data(row):
+    values = [v for v in row if v is not None and normalize(v)]
+    numeric = sum(not isinstance(v, str) or any(ch.isdigit() for ch in v) for v in values)
+    return numeric * 2 > len(values)
+
+
+def guess_header_row(rows, filter_rows=()):
+    if filter_rows:
+        return min(filter_rows)
+    scores = [header_score(rows, i, set(), filter_rows) for i in range(len(rows))]
+    if not scores or max(scores) == 0:
+        return None
+    best = scores.index(max(scores))
+    return None if looks_like_data(rows[best]) else best
+
+
+@timed
+def detect_header(wb, expected_columns=()):
+    expected = {c.lower() for c in expected_columns}
+    best = None
+    for sheet in wb.sheetnames:
+        ws = wb[sheet]
+        rows = list(ws.iter_rows(max_row=HEAD_ROWS, max_col=HEAD_COLS, values_only=True))
+        filter_rows = get_filter_header_rows(ws)
+        for i in range(len(rows)):
+            score = header_score(rows, i, expected, filter_rows)
+            if ws.sheet_state != "visible":
+                score /= 2
+            if score > 0 and (best is None or score > best["score"]):
+                best = {"sheet": sheet, "header_row": i, "score": score,
+                        "columns": [normalize(v) for v in rows[i]
+                                    if v is not None and normalize(v)]}
+    return best
+
+
+def detect_headers(paths, expected_columns=()):
+    found = {}
+    for path in paths:
+        try:
+            wb = open_preview(path)
+        except Exception:
+            found[path] = None
+            continue
+        try:
+            found[path] = detect_header(wb, expected_columns)
+        finally:
+            wb.close()
+    return found
+
+
+def preview_with_header(path, expected_columns=()):
+    wb = open_preview(path)
+    return wb, detect_header(wb, expected_columns)
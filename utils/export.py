@@ -0,0 +1,280 @@
+import csv
+import io
+import re
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from utils.engine import summarize
+
+BATCH_FIELDS = ["path", "sheet", "template", "common", "only_in_1", "only_in_N", "changed",
+                "load_seconds", "error"]
+INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+INVALID_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+MAX_ROWS = 1048576
+XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+STYLES = (XML_HEAD + f'<styleSheet xmlns="{MAIN_NS}">'
+          '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+          '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+          '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+          '<fill><patternFill patternType="gray125"/></fill></fills>'
+          '<borders count="1"><border/></borders>'
+          '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+          '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+          '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+          '</styleSheet>')
+
+
+def xml_text(value):
+    text = str(value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return INVALID_XML_CHARS.sub("", text)
+
+
+def xml_attr(value):
+    return xml_text(value).replace('"', "&quot;")
+
+
+def xml_cell(value, style):
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c{style}><v>{value}</v></c>"
+    return f'<c t="inlineStr"{style}><is><t xml:space="preserve">{xml_text(value)}</t></is></c>'
+
+
+class SheetWriter:
+    def __init__(self, book, title, used):
+        self.book, self.title, self.used = book, title, used
+        self.repeat = []
+        self.open(sheet_title(title, used))
+
+    def open(self, title):
+        self.book.titles.append(title)
+        name = f"xl/worksheets/sheet{len(self.book.titles)}.xml"
+        self.raw = self.book.zip.open(name, "w", force_zip64=True)
+        self.out = io.TextIOWrapper(self.raw, encoding="utf-8", write_through=False)
+        self.out.write(XML_HEAD + f'<worksheet xmlns="{MAIN_NS}"><sheetData>')
+        self.rows = 0
+
+    def close(self):
+        self.out.write("</sheetData></worksheet>")
+        self.out.flush()
+        self.out.detach()
+        self.raw.close()
+
+    def append(self, values=(), bold=False):
+        if self.rows == self.book.max_rows:
+            self.close()
+            self.open(sheet_title(self.title, self.used))
+            for header in self.repeat:
+                self.write(header, True)
+        self.write(values, bold)
+
+    def write(self, values, bold):
+        style = ' s="1"' if bold else ""
+        self.out.write("<row>" + "".join(xml_cell(v, style) for v in values) + "</row>")
+        self.rows += 1
+
+
+class XlsxWriter:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.titles = []
+        self.used = set()
+        self.max_rows = MAX_ROWS
+
+    @contextmanager
+    def sheet(self, title):
+        ws = SheetWriter(self, title, self.used)
+        try:
+            yield ws
+        finally:
+            ws.close()
+
+    def close(self):
+        n = len(self.titles)
+        sheets = "".join(f'<sheet name="{xml_attr(t)}" sheetId="{i}" r:id="rId{i}"/>'
+                         for i, t in enumerate(self.titles, 1))
+        rels = "".join(f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" '
+                       f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, n + 1))
+        overrides = "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType='
+                            '"application/vnd.openxmlformats-officedocument.spreadsheetml.'
+                            'worksheet+xml"/>' for i in range(1, n + 1))
+        self.zip.writestr("xl/workbook.xml", XML_HEAD +
+                          f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+                          f'<sheets>{sheets}</sheets></workbook>')
+        self.zip.writestr("xl/_rels/workbook.xml.rels", XML_HEAD +
+                          f'<Relationships xmlns="{PKG_REL_NS}">{rels}'
+                          f'<Relationship Id="rId{n + 1}" Type="{REL_NS}/styles" '
+                          'Target="styles.xml"/></Relationships>')
+        self.zip.writestr("xl/styles.xml", STYLES)
+        self.zip.writestr("_rels/.rels", XML_HEAD +
+                          f'<Relationships xmlns="{PKG_REL_NS}"><Relationship Id="rId1" '
+                          f'Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+                          '</Relationships>')
+        self.zip.writestr("[Content_Types].xml", XML_HEAD +
+                          '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+                          'content-types"><Default Extension="rels" ContentType="application/'
+                          'vnd.openxmlformats-package.relationships+xml"/><Default '
+                          'Extension="xml" ContentType="application/xml"/><Override '
+                          'PartName="/xl/workbook.xml" ContentType="application/'
+                          'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                          '<Override PartName="/xl/styles.xml" ContentType="application/'
+                          'vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+                          f'{overrides}</Types>')
+        self.zip.close()
+
+
+def sheet_title(text, used):
+    base = INVALID_SHEET_CHARS.sub("_", text)[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title.lower())
+    return title
+
+
+def start_block(ws, title, count, col_names=None):
+    ws.append([title, count], bold=True)
+    ws.repeat = [[f"{title} (continued)"]]
+    if col_names:
+        ws.append(col_names, bold=True)
+        ws.repeat.append(col_names)
+
+
+def end_block(ws):
+    ws.repeat = []
+    ws.append()
+
+
+def rows_block(ws, title, col_names, rows_data):
+    start_block(ws, title, len(rows_data), ["Row"] + col_names)
+    for row in sorted(rows_data):
+        values = rows_data[row]
+        ws.append([row] + [values.get(col) for col in col_names])
+    end_block(ws)
+
+
+def write_xlsx(result, path):
+    book = XlsxWriter(path)
+    try:
+        with book.sheet("Summary") as ws:
+            ws.append(["File #1", "File #N", "Common", "Only in #1", "Only in #N", "#N"],
+                      bold=True)
+            for row in summarize(result):
+                ws.append(row)
+            ws.append()
+            ws.append(["#", "File", "Sheet", "Load seconds"], bold=True)
+            for fidx, info in sorted(result["files"].items()):
+                ws.append([fidx + 1, info["path"], info["sheet"], round(info["load_seconds"], 3)])
+        f1_name = Path(result["file_configs"][0]["path"]).name
+        for pair in result["pairs"]:
+            fN_name = Path(result["file_configs"][pair["index"]]["path"]).name
+            with book.sheet(f"1 vs {pair['index'] + 1} {fN_name}") as ws:
+                rows_block(ws, f"Only in {f1_name}", [c1 for c1, _ in pair["col_pairs"]],
+                           pair["rows_only_1"])
+                rows_block(ws, f"Only in {fN_name}", [cN for _, cN in pair["col_pairs"]],
+                           pair["rows_only_N"])
+                if pair["near"]:
+                    start_block(ws, "Near matches", len(pair["near"]), [f1_name, fN_name, "Score"])
+                    for v1, vN, score in pair["near"]:
+                        ws.append([v1, vN, round(score, 3)])
+                    end_block(ws)
+                if pair["key_pairs"]:
+                    start_block(ws, "Changed", len(pair["changed"]),
+                                ["Key", f"{f1_name} row", f"{fN_name} row", "Column",
+                                 f"{f1_name} value", f"{fN_name} value"])
+                    for row in pair["changed"]:
+                        ws.append(row)
+                    end_block(ws)
+                start_block(ws, "Common", len(pair["common"]))
+                for v in sorted(pair["common"]):
+                    ws.append([v])
+        if result["nway"]:
+            with book.sheet("All files") as ws:
+                start_block(ws, "In every file", len(result["nway"]["in_all"]))
+                for v in sorted(result["nway"]["in_all"]):
+                    ws.append([v])
+                end_block(ws)
+                for kind in ("only_in", "missing_from"):
+                    for fidx, values in sorted(result["nway"][kind].items()):
+                        name = Path(result["file_configs"][fidx]["path"]).name
+                        start_block(ws, f"{kind.replace('_', ' ').capitalize()} {name}",
+                                    len(values))
+                        for v in sorted(values):
+                            ws.append([v])
+                        end_block(ws)
+    finally:
+        book.close()
+
+
+def write_csv(result, out):
+    writer = csv.writer(out)
+    writer.writerow(["pair", "file", "row", "column", "value"])
+    f1_name = Path(result["file_configs"][0]["path"]).name
+    for pair in result["pairs"]:
+        fN_name = Path(result["file_configs"][pair["index"]]["path"]).name
+        label = f"{f1_name} vs {fN_name}"
+        for name, rows_data in ((f1_name, pair["rows_only_1"]), (fN_name, pair["rows_only_N"])):
+            for row in sorted(rows_data):
+                for col, val in rows_data[row].items():
+                    writer.writerow([label, name, row, col, val])
+        for v1, vN, score in pair["near"]:
+            writer.writerow([label, f"{f1_name} ~ {fN_name}", "", f"near match {score:.2f}",
+                             f"{v1} ~ {vN}"])
+        for key, r1, rN, col, old, new in pair["changed"] if pair["key_pairs"] else ():
+            writer.writerow([label, f"{f1_name} -> {fN_name}", f"{r1} -> {rN}",
+                             f"changed {col}", f"{old} -> {new}"])
+        for v in sorted(pair["common"]):
+            writer.writerow([label, "both", "", "common", v])
+    if result["nway"]:
+        for kind in ("only_in", "missing_from"):
+            for fidx, values in result["nway"][kind].items():
+                name = Path(result["file_configs"][fidx]["path"]).name
+                for val in sorted(values):
+                    writer.writerow(["all files", name, "", kind.replace("_", " "), val])
+
+
+def export_result(result, path):
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            write_csv(result, f)
+    else:
+        write_xlsx(result, path)
+    return path
+
+
+def batch_values(row):
+    values = [row[field] for field in BATCH_FIELDS]
+    if row["load_seconds"] is not None:
+        values[BATCH_FIELDS.index("load_seconds")] = round(row["load_seconds"], 3)
+    return values
+
+
+def write_batch_csv(rows, out):
+    writer = csv.writer(out)
+    writer.writerow(BATCH_FIELDS)
+    writer.writerows(batch_values(row) for row in rows)
+
+
+def write_batch_xlsx(rows, path):
+    book = XlsxWriter(path)
+    try:
+        with book.sheet("Batch") as ws:
+            ws.append(BATCH_FIELDS, bold=True)
+            for row in rows:
+                ws.append(batch_values(row))
+    finally:
+        book.close()
+
+
+def export_batch(rows, path):
+    if Path(path).suffix.lower() == ".csv":
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            write_batch_csv(rows, f)
+    else:
+        write_batch_xlsx(rows, path)
+    return path
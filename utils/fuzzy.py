@@ -0,0 +1,128 @@
+import re
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+DEFAULT_THRESHOLD = 0.8
+CANDIDATES = 32
+CHUNK = 10000
+NON_ALNUM = re.compile(r"[\W_]+")
+
+
+class Cancelled(Exception):
+    pass
+
+
+def canonical(value):
+    return NON_ALNUM.sub("", value.lower())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def ranges(starts, counts):
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+
+def ranked_trigrams(forms):
+    grams = [trigrams(form) for form in forms]
+    sizes = np.fromiter(map(len, grams), dtype=np.int64, count=len(grams))
+    tokens, _ = pd.factorize(np.fromiter(chain.from_iterable(grams), dtype=object,
+                                          count=int(sizes.sum())))
+    rank = np.empty(tokens.max(initial=-1) + 1, dtype=np.int64)
+    rank[np.argsort(np.bincount(tokens), kind="stable")] = np.arange(len(rank))
+    owner = np.repeat(np.arange(len(sizes)), sizes)
+    tokens = rank[tokens]
+    return tokens[np.lexsort((tokens, owner))], sizes
+
+
+def prefix_entries(sizes, offsets, threshold):
+    owner = np.repeat(np.arange(len(sizes)), sizes)
+    position = np.arange(len(owner)) - offsets[owner]
+    length = sizes - np.ceil(threshold * sizes - 1e-9).astype(np.int64) + 1
+    return (position < length[owner]).nonzero()[0], owner
+
+
+def overlaps(tokens, sizes, offsets, i, j):
+    width = int(tokens.max()) + 1
+    pair = np.arange(len(i))
+    keys = np.sort(np.concatenate([np.repeat(pair, sizes[ids]) * width
+                                   + tokens[ranges(offsets[ids], sizes[ids])]
+                                   for ids in (i, j)]))
+    shared = keys[1:][keys[1:] == keys[:-1]] // width
+    return np.bincount(shared, minlength=len(i))
+
+
+def neighbours(tokens, order, side_1, side_N, owner):
+    width = len(order)
+    keys_N = np.sort(tokens[side_N] * width + order[owner[side_N]])
+    lookup = tokens[side_1] * width + order[owner[side_1]]
+    low = np.searchsorted(keys_N, tokens[side_1] * width, "left")
+    high = np.searchsorted(keys_N, (tokens[side_1] + 1) * width, "left")
+    middle = np.searchsorted(keys_N, lookup, "left")
+    first = np.clip(middle - CANDIDATES // 4, low, np.maximum(high - CANDIDATES // 2, low))
+    count = np.minimum(high - first, CANDIDATES // 2)
+    return np.repeat(owner[side_1], count), keys_N[ranges(first, count)] % width
+
+
+def candidate_pairs(tokens, sizes, offsets, forms, n_1, threshold, cancel=None):
+    entries, owner = prefix_entries(sizes, offsets, threshold)
+    side_1, side_N = entries[owner[entries] < n_1], entries[owner[entries] >= n_1]
+    orders = []
+    for text in (forms, [form[::-1] for form in forms]):
+        order = np.empty(len(forms), dtype=np.int64)
+        order[np.argsort(np.asarray(text, dtype=object), kind="stable")] = np.arange(len(forms))
+        orders.append((order, np.argsort(order)))
+    bounds = np.searchsorted(owner[side_1], np.arange(0, n_1 + CHUNK, CHUNK))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if cancel is not None and cancel.is_set():
+            raise Cancelled()
+        found = [neighbours(tokens, order, side_1[start:stop], side_N, owner)
+                 for order, _ in orders]
+        pairs, hits = np.unique(np.concatenate([i * len(forms) + by_order[j]
+                                                for (i, j), (_, by_order) in zip(found, orders)]),
+                                return_counts=True)
+        i, j = pairs // len(forms), pairs % len(forms)
+        fits = (sizes[j] >= threshold * sizes[i] - 1e-9) & (sizes[i] >= threshold * sizes[j] - 1e-9)
+        i, j, hits = i[fits], j[fits], hits[fits]
+        ranked = np.lexsort((np.abs(sizes[i] - sizes[j]), -hits, i))
+        i, j = i[ranked], j[ranked]
+        group_start = np.flatnonzero(np.r_[True, i[1:] != i[:-1]])
+        within = np.arange(len(i)) - np.repeat(group_start, np.diff(np.r_[group_start, len(i)]))
+        i, j = i[within < CANDIDATES], j[within < CANDIDATES]
+        shared = overlaps(tokens, sizes, offsets, i, j)
+        score = shared / (sizes[i] + sizes[j] - shared)
+        keep = score >= threshold
+        yield i[keep], j[keep] - n_1, score[keep]
+
+
+def exact_pairs(forms_1, forms_N):
+    codes, _ = pd.factorize(np.asarray(forms_1 + forms_N, dtype=object))
+    exact = pd.DataFrame({"code": codes[:len(forms_1)], "i": np.arange(len(forms_1))}).merge(
+        pd.DataFrame({"code": codes[len(forms_1):], "j": np.arange(len(forms_N))}), on="code")
+    return exact["i"].to_numpy(), exact["j"].to_numpy(), np.ones(len(exact))
+
+
+def fuzzy_matches(values_1, values_N, threshold=DEFAULT_THRESHOLD, cancel=None):
+    forms_1 = [canonical(v) for v in values_1]
+    forms_N = [canonical(v) for v in values_N]
+    keep_1 = [i for i, form in enumerate(forms_1) if form]
+    keep_N = [j for j, form in enumerate(forms_N) if form]
+    forms_1, forms_N = [forms_1[i] for i in keep_1], [forms_N[j] for j in keep_N]
+    if not forms_1 or not forms_N:
+        return []
+    tokens, sizes = ranked_trigrams(forms_1 + forms_N)
+    offsets = np.cumsum(sizes) - sizes
+    found = [exact_pairs(forms_1, forms_N),
+             *candidate_pairs(tokens, sizes, offsets, forms_1 + forms_N, len(forms_1), threshold,
+                              cancel)]
+    i, j, score = (np.concatenate(parts) for parts in zip(*found))
+    order = np.lexsort((j, i, -score))
+    used_1, used_N, matches = bytearray(len(forms_1)), bytearray(len(forms_N)), []
+    for i, j, score in zip(i[order].tolist(), j[order].tolist(), score[order].tolist()):
+        if not used_1[i] and not used_N[j]:
+            used_1[i] = used_N[j] = 1
+            matches.append((keep_1[i], keep_N[j], score))
+    return matches
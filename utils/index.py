@@ -0,0 +1,185 @@
+import glob
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from utils.cache import cache_dir, fingerprint
+from utils.comparison import collect_col_data
+from utils.excel import WorkbookSession, get_filter_header_rows, guess_header_row
+from utils.timing import span
+
+MAX_CHAR = chr(0x10FFFF)
+WORKBOOK_SUFFIXES = (".xlsx", ".xlsm", ".xls")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER,
+                                  mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS columns (id INTEGER PRIMARY KEY, file_id INTEGER, sheet TEXT,
+                                    header_row INTEGER, name TEXT);
+CREATE TABLE IF NOT EXISTS vals (id INTEGER PRIMARY KEY, value TEXT UNIQUE, key TEXT,
+                                 reversed TEXT);
+CREATE TABLE IF NOT EXISTS cells (value_id INTEGER, column_id INTEGER, row INTEGER,
+                                  PRIMARY KEY (value_id, column_id, row)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS columns_file ON columns (file_id);
+CREATE INDEX IF NOT EXISTS vals_key ON vals (key);
+CREATE INDEX IF NOT EXISTS vals_reversed ON vals (reversed);
+CREATE INDEX IF NOT EXISTS cells_column ON cells (column_id);
+"""
+
+
+def index_path():
+    return Path(os.environ.get("ECC_INDEX") or cache_dir() / "index.sqlite")
+
+
+def connect(db=None):
+    db = Path(db or index_path())
+    db.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def is_workbook(path):
+    return path.suffix.lower() in WORKBOOK_SUFFIXES and not path.name.startswith("~$")
+
+
+def workbook_paths(targets):
+    for target in targets:
+        if glob.has_magic(str(target)):
+            for path in sorted(glob.glob(str(target), recursive=True)):
+                if Path(path).is_file() and is_workbook(Path(path)):
+                    yield str(Path(path).resolve())
+            continue
+        target = Path(target)
+        if target.is_dir():
+            for path in sorted(target.rglob("*")):
+                if is_workbook(path):
+                    yield str(path.resolve())
+        else:
+            yield str(target.resolve())
+
+
+def sheet_header_row(wb, sheet):
+    filter_rows = (set() if Path(wb.path).suffix.lower() == ".xls"
+                   else get_filter_header_rows(wb.workbook[sheet]))
+    return guess_header_row(wb.head_rows(sheet), filter_rows)
+
+
+def extract_workbook(path, engine=None):
+    columns = []
+    with span("index_workbook", file=Path(path).name), WorkbookSession(path, engine) as wb:
+        for sheet in wb.sheetnames:
+            header_row = sheet_header_row(wb, sheet)
+            df = wb.read_dataframe(sheet, header_row)
+            if header_row is None:
+                df.columns = [f"Column {i + 1}" for i in range(len(df.columns))]
+            for name in dict.fromkeys(df.columns):
+                data = collect_col_data(df, name, -1 if header_row is None else header_row)
+                if len(data):
+                    columns.append((sheet, header_row, name, data))
+    return path, columns
+
+
+def remove_file(conn, file_id):
+    conn.execute("DELETE FROM cells WHERE column_id IN "
+                 "(SELECT id FROM columns WHERE file_id = ?)", (file_id,))
+    conn.execute("DELETE FROM columns WHERE file_id = ?", (file_id,))
+    conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def store_workbook(conn, path, file_fingerprint, columns):
+    old = conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+    if old:
+        remove_file(conn, old[0])
+    _, size, mtime_ns = file_fingerprint
+    file_id = conn.execute("INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                           (path, size, mtime_ns)).lastrowid
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (value TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM incoming")
+    values = {v for *_, data in columns for v in data.dictionary.tolist()}
+    conn.executemany("INSERT INTO incoming VALUES (?)", ((v,) for v in values))
+    conn.executemany("INSERT OR IGNORE INTO vals (value, key, reversed) VALUES (?, ?, ?)",
+                     ((v, v.lower(), v.lower()[::-1]) for v in values))
+    ids = dict(conn.execute("SELECT i.value, v.id FROM incoming i JOIN vals v USING (value)"))
+    for sheet, header_row, name, data in columns:
+        column_id = conn.execute("INSERT INTO columns (file_id, sheet, header_row, name) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 (file_id, sheet, header_row, name)).lastrowid
+        value_ids = [ids[v] for v in data.dictionary.tolist()]
+        conn.executemany("INSERT INTO cells VALUES (?, ?, ?)",
+                         ((value_ids[code], column_id, row)
+                          for code, row in zip(data.codes.tolist(), data.rows.tolist())))
+
+
+def update_index(targets, db=None, engine=None, workers=None, prune=True):
+    conn = connect(db)
+    try:
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                 conn.execute("SELECT path, size, mtime_ns FROM files")}
+        fingerprints = {path: fingerprint(path) for path in dict.fromkeys(workbook_paths(targets))}
+        stale = [path for path, fp in fingerprints.items() if known.get(path) != tuple(fp[1:])]
+        removed = [path for path in known if prune and not os.path.exists(path)]
+        for path in removed:
+            remove_file(conn, conn.execute("SELECT id FROM files WHERE path = ?",
+                                           (path,)).fetchone()[0])
+        workers = workers or min(len(stale), os.cpu_count() or 1)
+        failed = {}
+        if workers <= 1:
+            results = (safe_extract(path, engine) for path in stale)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(safe_extract, stale, [engine] * len(stale))
+        try:
+            for path, columns in results:
+                if isinstance(columns, Exception):
+                    failed[path] = columns
+                    continue
+                with span("index_store", file=Path(path).name):
+                    store_workbook(conn, path, fingerprints[path], columns)
+                conn.commit()
+        finally:
+            if workers > 1:
+                pool.shutdown()
+        if removed or any(path in known for path in stale):
+            conn.execute("DELETE FROM vals WHERE id NOT IN (SELECT value_id FROM cells)")
+        conn.commit()
+        return {"indexed": [p for p in stale if p not in failed], "removed": removed,
+                "unchanged": len(fingerprints) - len(stale), "failed": failed}
+    finally:
+        conn.close()
+
+
+def safe_extract(path, engine=None):
+    try:
+        return extract_workbook(path, engine)
+    except Exception as e:
+        return path, e
+
+
+def lookup(pattern, db=None, limit=None):
+    pattern = pattern.lower()
+    if pattern in ("", "*", "**"):
+        where, params = "1", ()
+    elif pattern.startswith("*") and pattern.endswith("*"):
+        where, params = "instr(v.key, ?) > 0", (pattern[1:-1],)
+    elif pattern.startswith("*"):
+        suffix = pattern[1:][::-1]
+        where, params = "v.reversed >= ? AND v.reversed < ?", (suffix, suffix + MAX_CHAR)
+    elif pattern.endswith("*"):
+        prefix = pattern[:-1]
+        where, params = "v.key >= ? AND v.key < ?", (prefix, prefix + MAX_CHAR)
+    else:
+        where, params = "v.key = ?", (pattern,)
+    query = (f"SELECT v.value, f.path, c.sheet, c.name, x.row FROM vals v "
+             f"JOIN cells x ON x.value_id = v.id JOIN columns c ON c.id = x.column_id "
+             f"JOIN files f ON f.id = c.file_id WHERE {where} "
+             f"ORDER BY f.path, c.sheet, x.row, c.id")
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    conn = connect(db)
+    try:
+        return [{"value": value, "path": path, "sheet": sheet, "column": column, "row": row}
+                for value, path, sheet, column, row in conn.execute(query, params)]
+    finally:
+        conn.close()
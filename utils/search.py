@@ -0,0 +1,65 @@
+from bisect import bisect_left, bisect_right
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class SearchIndex:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.texts = None
+        self.prefixes = None
+        self.suffixes = None
+        self.last_needle, self.last_ids = None, None
+
+    def lowered(self):
+        if self.texts is None:
+            self.texts = [[str(v).lower() for v in values] for values in self.rows]
+        return self.texts
+
+    def sorted_keys(self, reverse_text):
+        keys, ids = [], []
+        for i, texts in enumerate(self.lowered()):
+            for t in texts:
+                keys.append(t[::-1] if reverse_text else t)
+                ids.append(i)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return [keys[j] for j in order], [ids[j] for j in order]
+
+    def prepare(self):
+        if self.prefixes is None:
+            self.prefixes = self.sorted_keys(False)
+        if self.suffixes is None:
+            self.suffixes = self.sorted_keys(True)
+
+    def key_range(self, keys, ids, start):
+        lo = bisect_left(keys, start)
+        hi = bisect_left(keys, start + MAX_CHAR, lo)
+        return set(ids[lo:hi])
+
+    def search(self, pattern):
+        pattern = pattern.lower()
+        if pattern in ("", "*", "**"):
+            return self.rows
+        if pattern.startswith("*") and pattern.endswith("*"):
+            ids = self.contains(pattern[1:-1])
+        elif pattern.startswith("*"):
+            self.prepare()
+            ids = self.key_range(*self.suffixes, pattern[1:][::-1])
+        elif pattern.endswith("*"):
+            self.prepare()
+            ids = self.key_range(*self.prefixes, pattern[:-1])
+        else:
+            self.prepare()
+            keys, key_ids = self.prefixes
+            ids = set(key_ids[bisect_left(keys, pattern):bisect_right(keys, pattern)])
+        return [self.rows[i] for i in sorted(ids)]
+
+    def contains(self, needle):
+        texts = self.lowered()
+        if self.last_needle is not None and self.last_needle in needle:
+            candidates = self.last_ids
+        else:
+            candidates = range(len(texts))
+        ids = [i for i in candidates if any(needle in t for t in texts[i])]
+        self.last_needle, self.last_ids = needle, ids
+        return ids
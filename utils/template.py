@@ -1,31 +1,16 @@
 import tkinter as tk
-from openpyxl import load_workbook
 from utils.theme import COLORS as C, F, F_BOLD
-from utils.excel import get_columns_at_row, find_actual_header_row
+from utils.excel import WorkbookSession, validate_against_template
 
 
 def validate_file_against_template(template_config, file_cfg):
-    expected_row = template_config["header_row"]
-    template_cols = template_config["columns"]
-    template_sheet = template_config["sheet"]
-    wb = load_workbook(file_cfg["path"], data_only=True, read_only=True)
-    sheet_found = template_sheet in wb.sheetnames
-    actual_sheet = template_sheet if sheet_found else wb.sheetnames[0]
-    wb.close()
-    actual_cols = get_columns_at_row(file_cfg["path"], actual_sheet, expected_row)
-    missing = [c for c in template_cols if c not in actual_cols]
-    extra = [c for c in actual_cols if c not in template_cols]
-    actual_row = None
-    if missing:
-        found = find_actual_header_row(file_cfg["path"], actual_sheet, template_cols)
-        actual_row = (found + 1) if found is not None else None
-    return {"expected_row": expected_row + 1, "missing": missing, "extra": extra,
-            "actual_row": actual_row, "sheet_found": sheet_found,
-            "expected_sheet": template_sheet, "actual_sheet": actual_sheet}
+    with WorkbookSession(file_cfg["path"]) as wb:
+        return validate_against_template(wb, template_config)
 
 
-def show_template_validation_card(parent, template_config, file_cfg, file_name):
-    v = validate_file_against_template(template_config, file_cfg)
+def show_template_validation_card(parent, template_config, file_cfg, file_name, v=None):
+    if v is None:
+        v = validate_file_against_template(template_config, file_cfg)
     bg = C["surface2"]
     vcard = tk.Frame(parent, bg=bg, highlightbackground=C["border"], highlightthickness=1)
     vcard.pack(fill=tk.X, padx=15, pady=(2, 8))
@@ -1,3 +1,28 @@
+from importlib.util import find_spec
+
+STRING_DTYPE = "string[pyarrow]" if find_spec("pyarrow") else object
+
+
+def strip_unprintable(text):
+    return ''.join(c if c.isprintable() else ' ' for c in text)
+
+
 def normalize(text):
-    cleaned = ''.join(c if c.isprintable() else ' ' for c in str(text))
-    return ' '.join(cleaned.split())
+    return ' '.join(strip_unprintable(str(text)).split())
+
+
+def series_to_str(series):
+    kind = series.dtype.kind
+    if kind in "Oiub":
+        return series.astype(str)
+    if kind == "M" and series.dt.tz is None and not (series.dt.microsecond | series.dt.nanosecond).any():
+        return series.dt.strftime("%Y-%m-%d %H:%M:%S")
+    return series.map(str)
+
+
+def normalize_series(series):
+    s = series_to_str(series).astype(STRING_DTYPE)
+    suspect = s.str.contains(r"[^\x20-\x7e]", regex=True)
+    if suspect.any():
+        s[suspect] = s[suspect].astype(object).map(strip_unprintable)
+    return s.str.replace(r" {2,}", " ", regex=True).str.strip(" ")
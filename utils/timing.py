@@ -0,0 +1,89 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_PATH = os.environ.get("ECC_TIMING_LOG")
+PROFILE_PATH = os.environ.get("ECC_PROFILE")
+
+records = []
+lock = threading.Lock()
+
+
+def record(name, seconds, **details):
+    with lock:
+        records.append(dict(details, name=name, seconds=seconds))
+
+
+@contextmanager
+def span(name, **details):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, **details)
+
+
+def timed(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def mark():
+    return len(records)
+
+
+def take(since=0):
+    with lock:
+        taken = records[since:]
+        del records[since:]
+    return taken
+
+
+def extend(items):
+    with lock:
+        records.extend(items)
+
+
+def totals(items):
+    stages = {}
+    for r in items:
+        calls, seconds, slowest = stages.get(r["name"], (0, 0.0, 0.0))
+        stages[r["name"]] = (calls + 1, seconds + r["seconds"], max(slowest, r["seconds"]))
+    return sorted(((name, *stage) for name, stage in stages.items()),
+                  key=lambda s: s[2], reverse=True)
+
+
+def write_log(items, path=LOG_PATH, **details):
+    if not path:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(dict(details, time=time.time(), spans=items), default=str) + "\n")
+
+
+@contextmanager
+def profiled(path=PROFILE_PATH):
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        if path.endswith(".prof"):
+            profile.dump_stats(path)
+        else:
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(60)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(out.getvalue())
@@ -1,3 +1,6 @@
+from tkinter import ttk
+
+
 def calculate_column_width(col_index, all_values, heading_text):
     max_len = len(heading_text)
     for row_values in all_values:
@@ -12,3 +15,55 @@ def auto_size_columns(tree, column_ids, all_values, headings):
     for i, col_id in enumerate(column_ids):
         width = calculate_column_width(i, all_values, headings[i])
         tree.column(col_id, width=width, minwidth=60, stretch=False)
+
+
+def sample_rows(all_values, limit=200):
+    step = max(1, len(all_values) // limit)
+    return all_values[::step]
+
+
+class VirtualTreeview(ttk.Treeview):
+    def __init__(self, master, rows, height=10, **kw):
+        super().__init__(master, height=height, **kw)
+        self.rows = rows
+        self.page = height
+        self.offset = 0
+        self.sort_desc = False
+        self.pending_filter = None
+        self.scroll_command = None
+        self.render()
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.offset = 0
+        self.render()
+
+    def set_scroll_command(self, command):
+        self.scroll_command = command
+        command(*self.yview())
+
+    def render(self):
+        self.offset = max(0, min(self.offset, len(self.rows) - self.page))
+        self.delete(*self.get_children())
+        for i, values in enumerate(self.rows[self.offset:self.offset + self.page], self.offset):
+            self.insert("", "end", values=values, tags=("alt" if i % 2 else "normal",))
+        if self.scroll_command:
+            self.scroll_command(*self.yview())
+
+    def yview(self, *args):
+        if not args:
+            if not self.rows:
+                return 0.0, 1.0
+            return (self.offset / len(self.rows),
+                    min(1.0, (self.offset + self.page) / len(self.rows)))
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            self.offset += int(args[1]) * (self.page if args[2] == "pages" else 1)
+        self.render()
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def yview_moveto(self, fraction):
+        self.yview("moveto", fraction)
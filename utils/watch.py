@@ -0,0 +1,55 @@
+import os
+import threading
+from pathlib import Path
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+DEBOUNCE_SECONDS = float(os.environ.get("ECC_WATCH_DEBOUNCE", "0.5"))
+IGNORED_EVENTS = {"opened", "closed_no_write"}
+
+
+class FileWatcher(FileSystemEventHandler):
+    def __init__(self, paths, on_change, delay=DEBOUNCE_SECONDS):
+        self.paths = {os.path.normcase(Path(p).resolve()): p for p in paths}
+        self.on_change = on_change
+        self.delay = delay
+        self.timers = {}
+        self.lock = threading.Lock()
+        self.observer = Observer()
+        for folder in {os.path.dirname(p) for p in self.paths}:
+            self.observer.schedule(self, folder)
+
+    def start(self):
+        self.observer.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            for timer in self.timers.values():
+                timer.cancel()
+            self.timers.clear()
+        self.observer.stop()
+        self.observer.join()
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in IGNORED_EVENTS:
+            return
+        for p in (event.src_path, event.dest_path):
+            path = p and self.paths.get(os.path.normcase(Path(os.fsdecode(p)).resolve()))
+            if path:
+                self.schedule(path)
+
+    def schedule(self, path):
+        with self.lock:
+            if path in self.timers:
+                self.timers[path].cancel()
+            timer = threading.Timer(self.delay, self.fire, (path,))
+            timer.daemon = True
+            self.timers[path] = timer
+            timer.start()
+
+    def fire(self, path):
+        with self.lock:
+            self.timers.pop(path, None)
+        if os.path.exists(path):
+            self.on_change(path)